@@ -3,5 +3,4 @@
 cd /d %~dp0
 
 mkdir dist build
-ffmpeg -i audio\in.flac build\in.wav
 python -m src.wave
\ No newline at end of file
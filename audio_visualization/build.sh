@@ -3,5 +3,4 @@
 cd $(readlink -f "$(dirname "$0")")
 
 mkdir build dist
-ffmpeg -i "audio/in.flac" "build/in.wav"
 python3 -m src.wave
\ No newline at end of file
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+"""A module for statistics and envelopes of audio files with caches."""
+
+
+import hashlib
+import io
+import json
+import math
+import pathlib
+import wave
+from typing import Any, Dict, List, Union
+
+import numpy as np
+
+from .audio_visualization import FFmpegAudio, WaveMap, get_spectrum
+from .audio_visualization import get_wave_envelope, iter_frames, open_audio
+from .segments import write_atomic
+
+
+# Version of the format of cached statistics
+# NOTE: Bump it whenever statistics are computed differently, so that old
+# sidecar files are ignored.
+STATS_CACHE_VERSION = 3
+# Suffixes of sidecar files appended to the path of an audio file
+STATS_CACHE_SUFFIX = '.stats.json'
+ENVELOPE_CACHE_SUFFIX = '.envelope.npy'
+SPECTRUM_CACHE_SUFFIX = '.spectrum.npy'
+# The number of bytes hashed at both the head and the tail of a file
+HASH_BLOCK_SIZE = 1048576
+
+# Type aliases
+_WaveReader = Union[wave.Wave_read, WaveMap, FFmpegAudio]
+
+
+class AudioStats:
+    """A class for statistics of an audio file."""
+
+    attrs = ('nframes', 'nchannels', 'framerate', 'full_scale', 'peak', 'rms',
+             'loudness', 'channel_min', 'channel_max', 'channel_rms')
+
+    def __init__(
+        self,
+        nframes: int = 0,
+        nchannels: int = 0,
+        framerate: int = 0,
+        full_scale: float = 1.0,
+        peak: float = 0.0,
+        rms: float = 0.0,
+        loudness: float = -math.inf,
+        channel_min: Union[List[float], None] = None,
+        channel_max: Union[List[float], None] = None,
+        channel_rms: Union[List[float], None] = None
+    ):
+        """An audio statistics object.
+
+        NOTE: All sample values are in the unit of raw samples, e.g. ``peak``
+        of an int16 track is at most 32768, and ``full_scale`` is the maximum
+        absolute sample value of the format. ``loudness`` is the unweighted
+        mean square of all channels in dBFS.
+        """
+
+        self.nframes = nframes
+        self.nchannels = nchannels
+        self.framerate = framerate
+        self.full_scale = full_scale
+        self.peak = peak
+        self.rms = rms
+        self.loudness = loudness
+        self.channel_min = channel_min or []
+        self.channel_max = channel_max or []
+        self.channel_rms = channel_rms or []
+
+    def __repr__(self):
+        attrs_str = ', '.join('%s=%r' % (k, getattr(self, k))
+                              for k in self.attrs)
+        return '%s(%s)' % (type(self).__name__, attrs_str)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.attrs}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> 'AudioStats':
+        return cls(**{k: d[k] for k in cls.attrs})
+
+
+def get_full_scale(wr: _WaveReader) -> float:
+    """Get the maximum absolute sample value of the format of a track."""
+
+    if not isinstance(wr, wave.Wave_read) and wr.isfloat():
+        return 1.0
+    return float(1 << (wr.getsampwidth() * 8 - 1))
+
+
+def compute_audio_stats(
+    wr: _WaveReader,
+    chunk: int = 1048576
+) -> AudioStats:
+    """Compute statistics of a track in a single streaming pass.
+
+    :param wr: a ``Wave_read`` object or a reader from ``open_audio()``
+
+    :param chunk: The number of frames handled in every iteration.
+    (default: 1048576)
+
+    :returns: an ``AudioStats`` object
+    """
+
+    nchannels = wr.getnchannels()
+    nframes = wr.getnframes()
+    # NOTE: Extremes start from infinities, since a channel may never cross
+    # zero.
+    ch_min = np.full(nchannels, np.inf)
+    ch_max = np.full(nchannels, -np.inf)
+    ch_sumsq = np.zeros(nchannels)
+    for w in iter_frames(wr, chunk):
+        w = w.astype(np.float64)
+        np.minimum(ch_min, w.min(axis=0), out=ch_min)
+        np.maximum(ch_max, w.max(axis=0), out=ch_max)
+        ch_sumsq += np.einsum('ij,ij->j', w, w)
+    # an empty track has no extremes
+    if nframes == 0:
+        ch_min[:] = ch_max[:] = 0.0
+
+    full_scale = get_full_scale(wr)
+    ch_meansq = ch_sumsq / max(nframes, 1)
+    meansq = float(ch_meansq.mean()) if nchannels else 0.0
+    if meansq > 0:
+        loudness = 10 * math.log10(meansq / full_scale ** 2)
+    else:
+        loudness = -math.inf
+    return AudioStats(
+        nframes, nchannels, wr.getframerate(), full_scale,
+        max(-float(ch_min.min()), float(ch_max.max())) if nchannels else 0.0,
+        math.sqrt(meansq), loudness, ch_min.tolist(), ch_max.tolist(),
+        np.sqrt(ch_meansq).tolist())
+
+
+def get_file_key(path: Union[str, pathlib.Path]) -> Dict[str, Any]:
+    """Get the key identifying the content of a file.
+
+    The key includes the resolved path, size, modification time and a hash of
+    the head and the tail of the file, which is cheap even for huge files.
+    """
+
+    path = pathlib.Path(path).resolve()
+    st = path.stat()
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        h.update(f.read(HASH_BLOCK_SIZE))
+        if st.st_size > HASH_BLOCK_SIZE:
+            f.seek(max(st.st_size - HASH_BLOCK_SIZE, HASH_BLOCK_SIZE))
+            h.update(f.read())
+    return {
+        'path': str(path),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'hash': h.hexdigest()
+    }
+
+
+def get_audio_stats(
+    path: Union[str, pathlib.Path],
+    cache_dir: Union[str, pathlib.Path, None] = None,
+    chunk: int = 1048576
+) -> AudioStats:
+    """Get statistics of an audio file, using a sidecar cache file if
+    possible.
+
+    :param path: path of the audio file
+
+    :param cache_dir: The directory of the sidecar cache file. Use ``None``
+    for the directory of the audio file. (default: None)
+
+    :param chunk: The number of frames handled in every iteration.
+    (default: 1048576)
+
+    :returns: an ``AudioStats`` object
+    """
+
+    path = pathlib.Path(path)
+    if cache_dir is None:
+        cache_dir = path.parent
+    cache_path = pathlib.Path(cache_dir) / (path.name + STATS_CACHE_SUFFIX)
+    key = get_file_key(path)
+
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached['version'] == STATS_CACHE_VERSION and cached['key'] == key:
+            return AudioStats.from_dict(cached['stats'])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    wr = open_audio(path)
+    stats = compute_audio_stats(wr, chunk)
+    wr.close()
+
+    try:
+        write_atomic(cache_path, json.dumps({
+            'version': STATS_CACHE_VERSION,
+            'key': key,
+            'stats': stats.to_dict()
+        }))
+    except OSError:
+        pass
+
+    return stats
+
+
+def _get_array_cache_path(
+    path: pathlib.Path,
+    cache_dir: Union[str, pathlib.Path, None],
+    suffix: str,
+    **params
+) -> pathlib.Path:
+    """Get the path of a sidecar cache file of an array computed from the
+    content of a file with parameters.
+    """
+
+    if cache_dir is None:
+        cache_dir = path.parent
+    key = get_file_key(path)
+    key.update(version=STATS_CACHE_VERSION, **params)
+    digest = hashlib.blake2b(json.dumps(key, sort_keys=True).encode(),
+                             digest_size=8).hexdigest()
+    return pathlib.Path(cache_dir) / ('%s.%s%s' % (path.name, digest, suffix))
+
+
+def _save_array_cache(cache_path: pathlib.Path, arr: np.ndarray):
+    """Write an array to a cache file through a temporary file."""
+
+    f = io.BytesIO()
+    np.save(f, arr)
+    try:
+        write_atomic(cache_path, f.getvalue())
+    except OSError:
+        pass
+
+
+def get_cached_wave_envelope(
+    path: Union[str, pathlib.Path],
+    frames_per_px: float,
+    cache_dir: Union[str, pathlib.Path, None] = None,
+    wr: Union[_WaveReader, None] = None
+) -> np.ndarray:
+    """Get the envelope of the whole track of an audio file, using a sidecar
+    cache file if possible.
+
+    The audio file is decoded only if there is no cache file for the same
+    content and ``frames_per_px``. See ``get_wave_envelope()`` for details.
+
+    :param path: path of the audio file
+
+    :param frames_per_px: the number of audio frames every pixel column takes
+
+    :param cache_dir: The directory of the sidecar cache file. Use ``None``
+    for the directory of the audio file. (default: None)
+
+    :param wr: A reader of the audio file from ``open_audio()``, which is
+    used instead of opening the file again and left open. Use ``None`` to
+    open the file if needed. (default: None)
+
+    :returns: a ``numpy.ndarray`` of float32 with shape (ncolumns, nchannels,
+    3), where ``ncolumns`` covers the whole track
+    """
+
+    path = pathlib.Path(path)
+    cache_path = _get_array_cache_path(path, cache_dir, ENVELOPE_CACHE_SUFFIX,
+                                       frames_per_px=frames_per_px)
+
+    try:
+        return np.load(cache_path)
+    except (OSError, ValueError):
+        pass
+
+    owned = wr is None
+    if owned:
+        wr = open_audio(path)
+    ncolumns = math.ceil(wr.getnframes() / frames_per_px)
+    envelope = get_wave_envelope(wr, frames_per_px, ncolumns)
+    if owned:
+        wr.close()
+
+    _save_array_cache(cache_path, envelope)
+    return envelope
+
+
+def get_cached_spectrum(
+    path: Union[str, pathlib.Path],
+    fps: float,
+    nbins: int = 64,
+    cache_dir: Union[str, pathlib.Path, None] = None,
+    wr: Union[_WaveReader, None] = None,
+    **kwargs
+) -> np.ndarray:
+    """Get the spectrum of the whole track of an audio file at every video
+    frame, using a sidecar cache file if possible.
+
+    The audio file is decoded only if there is no cache file for the same
+    content and parameters. See ``get_spectrum()`` for details and other
+    parameters.
+
+    :param path: path of the audio file
+
+    :param fps: frames per second of the video
+
+    :param nbins: the number of log-frequency bands (default: 64)
+
+    :param cache_dir: The directory of the sidecar cache file. Use ``None``
+    for the directory of the audio file. (default: None)
+
+    :param wr: A reader of the audio file from ``open_audio()``, which is
+    used instead of opening the file again and left open. Use ``None`` to
+    open the file if needed. (default: None)
+
+    :returns: a ``numpy.ndarray`` of float16 with shape (nframes, nbins),
+    where ``nframes`` covers the whole track
+    NOTE: It is stored as float16 to be compact, which is precise enough for
+    heights of bars.
+    """
+
+    path = pathlib.Path(path)
+    cache_path = _get_array_cache_path(path, cache_dir, SPECTRUM_CACHE_SUFFIX,
+                                       fps=fps, nbins=nbins, **kwargs)
+
+    try:
+        return np.load(cache_path)
+    except (OSError, ValueError):
+        pass
+
+    owned = wr is None
+    if owned:
+        wr = open_audio(path)
+    frames_per_window = wr.getframerate() / fps
+    nwindows = math.ceil(wr.getnframes() / frames_per_window)
+    spectrum = get_spectrum(wr, frames_per_window, nwindows, nbins,
+                            **kwargs).astype(np.float16)
+    if owned:
+        wr.close()
+
+    _save_array_cache(cache_path, spectrum)
+    return spectrum
@@ -3,58 +3,379 @@
 """A module for audio visualization."""
 
 
+import json
+import pathlib
+import struct
+import subprocess
 import wave
-from typing import Generator, Iterable, Union
+from typing import Generator, Iterable, Tuple, Union
 
-import matplotlib.pyplot as plt
 import numpy as np
 
 
-def get_wave_dots(wr: wave.Wave_read) -> np.ndarray:
+# WAVE format tags
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# NumPy dtypes of samples with every sample width (in bytes)
+# NOTE: 8-bit samples are unsigned. 24-bit samples have no NumPy dtype thus
+# are viewed as 3 bytes.
+INT_SAMPLE_DTYPES = {1: 'u1', 2: '<i2', 3: 'u1', 4: '<i4'}
+FLOAT_SAMPLE_DTYPES = {4: '<f4', 8: '<f8'}
+
+
+def decode_samples(samples: np.ndarray, sampwidth: int) -> np.ndarray:
+    """Decode raw samples from a WAV file into signed numbers.
+
+    :param samples: a ``numpy.ndarray`` with shape (nframes, nchannels) of
+    ``INT_SAMPLE_DTYPES`` or ``FLOAT_SAMPLE_DTYPES``, or with shape
+    (nframes, nchannels, 3) of uint8 for 24-bit samples
+
+    :param sampwidth: sample width in bytes
+
+    :returns: a ``numpy.ndarray`` with shape (nframes, nchannels), which is
+    the same array unless samples are 8-bit (decoded to int16) or 24-bit
+    (decoded to int32)
+    """
+
+    if sampwidth == 1 and samples.dtype == np.uint8:
+        return samples.astype(np.int16) - 128
+    if sampwidth == 3:
+        # NOTE: The most significant byte is read as int8 to extend the sign.
+        return (samples[..., 0].astype(np.int32) |
+                samples[..., 1].astype(np.int32) << 8 |
+                samples[..., 2].view(np.int8).astype(np.int32) << 16)
+    return samples
+
+
+class WaveMap:
+    """A class for a memory-mapped WAV file.
+
+    Only the PCM data chunk of the file is mapped into memory, thus samples
+    are read from the disk on demand and never loaded as a whole. It provides
+    the same ``get*()`` methods of parameters as ``wave.Wave_read`` does.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path]):
+        """A memory-mapped WAV file object.
+
+        :param path: path of the WAV file
+        """
+
+        fmt = None
+        data_offset = data_size = None
+        with open(path, 'rb') as f:
+            riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+            if riff != b'RIFF' or wave_id != b'WAVE':
+                raise ValueError('file is not a WAV file')
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    break
+                chunk_id, chunk_size = struct.unpack('<4sI', header)
+                if chunk_id == b'fmt ':
+                    fmt = f.read(chunk_size)
+                    # NOTE: Chunks are aligned to even bytes.
+                    f.seek(chunk_size % 2, 1)
+                elif chunk_id == b'data':
+                    data_offset = f.tell()
+                    data_size = chunk_size
+                    break
+                else:
+                    f.seek(chunk_size + chunk_size % 2, 1)
+        if fmt is None or data_offset is None:
+            raise ValueError('fmt or data chunk is missing')
+
+        (format_tag, self._nchannels, self._framerate, _, block_align,
+         bits) = struct.unpack('<HHIIHH', fmt[:16])
+        if format_tag == WAVE_FORMAT_EXTENSIBLE:
+            # the first two bytes of SubFormat GUID is the format tag
+            format_tag = struct.unpack('<H', fmt[24:26])[0]
+        if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+            raise ValueError('unsupported format tag: %#x' % format_tag)
+        self._sampwidth = block_align // self._nchannels
+        self._is_float = format_tag == WAVE_FORMAT_IEEE_FLOAT
+        if self._is_float:
+            dtype = FLOAT_SAMPLE_DTYPES.get(self._sampwidth)
+        else:
+            dtype = INT_SAMPLE_DTYPES.get(self._sampwidth)
+        if dtype is None:
+            raise ValueError('unsupported sample width: %d bits' % bits)
+        # NOTE: The data chunk may be truncated in an unfinished file.
+        self._nframes = min(data_size, pathlib.Path(path).stat().st_size -
+                            data_offset) // block_align
+        if self._sampwidth == 3:
+            shape = (self._nframes, self._nchannels, 3)
+        else:
+            shape = (self._nframes, self._nchannels)
+        self._samples = np.memmap(path, dtype=dtype, mode='r',
+                                  offset=data_offset, shape=shape)
+
+    def getnchannels(self) -> int: return self._nchannels
+
+    def getsampwidth(self) -> int: return self._sampwidth
+
+    def getframerate(self) -> int: return self._framerate
+
+    def getnframes(self) -> int: return self._nframes
+
+    def isfloat(self) -> bool: return self._is_float
+
+    @property
+    def samples(self) -> np.ndarray:
+        """A zero-copy view of all samples with shape (nframes, nchannels).
+
+        NOTE: Samples are raw, i.e. 8-bit samples are unsigned, and for 24-bit
+        samples the view is of uint8 with shape (nframes, nchannels, 3) in
+        little endian. ``read()`` should be used to get decoded samples.
+        """
+
+        return self._samples
+
+    def channel(self, idx: int) -> np.ndarray:
+        """A zero-copy view of samples of the ``idx``-th channel (starting
+        from 0)."""
+
+        return self._samples[:, idx]
+
+    def read(self, start: int, stop: int) -> np.ndarray:
+        """Read decoded samples of frames from ``start`` to ``stop``.
+
+        :returns: a ``numpy.ndarray`` with shape (nframes, nchannels), which is
+        a zero-copy view unless samples are 8-bit or 24-bit (see
+        ``decode_samples()``)
+        """
+
+        return decode_samples(self._samples[start:stop], self._sampwidth)
+
+    def close(self):
+        """Release the memory map."""
+
+        self._samples = None
+
+
+class FFmpegAudio:
+    """A class for an audio file of any format decoded by FFmpeg.
+
+    Samples are decoded into 32-bit floats by an FFmpeg process and streamed
+    through a pipe, so compressed audio (e.g. FLAC, MP3 and Opus) needs no
+    intermediate WAV file. It provides the same ``get*()`` methods of
+    parameters as ``wave.Wave_read`` does.
+
+    NOTE: Reading frames in order is efficient, while reading any frame
+    before the current position restarts the decoder.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path]):
+        """An FFmpeg-decoded audio file object.
+
+        :param path: path of the audio file
+        """
+
+        self._path = str(path)
+        probe = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'a:0',
+             '-show_entries', 'stream=channels,sample_rate,duration:'
+             'format=duration', '-of', 'json', self._path],
+            stdout=subprocess.PIPE, check=True)
+        info = json.loads(probe.stdout)
+        if not info.get('streams'):
+            raise ValueError('no audio stream in file')
+        stream = info['streams'][0]
+        self._nchannels = int(stream['channels'])
+        self._framerate = int(stream['sample_rate'])
+        duration = stream.get('duration') or info['format']['duration']
+        self._nframes = round(float(duration) * self._framerate)
+        self._proc = None
+        self._pos = 0
+
+    def getnchannels(self) -> int: return self._nchannels
+
+    def getsampwidth(self) -> int: return 4
+
+    def getframerate(self) -> int: return self._framerate
+
+    def getnframes(self) -> int: return self._nframes
+
+    def isfloat(self) -> bool: return True
+
+    def _restart(self):
+        """(Re)start the decoder from the beginning of the file."""
+
+        self.close()
+        self._proc = subprocess.Popen(
+            ['ffmpeg', '-v', 'error', '-i', self._path, '-map', '0:a:0',
+             '-f', 'f32le', '-acodec', 'pcm_f32le', '-'],
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+        self._pos = 0
+
+    def _read_decoded(self, nframes: int) -> np.ndarray:
+        """Read at most ``nframes`` frames from the decoder."""
+
+        frame_bytes = 4 * self._nchannels
+        data = self._proc.stdout.read(nframes * frame_bytes)
+        w = np.frombuffer(data, dtype='<f4',
+                          count=len(data) // frame_bytes * self._nchannels)
+        self._pos += w.shape[0] // self._nchannels
+        return np.reshape(w, (w.shape[0] // self._nchannels, self._nchannels))
+
+    def read(self, start: int, stop: int) -> np.ndarray:
+        """Read decoded samples of frames from ``start`` to ``stop``.
+
+        NOTE: Frames after the end of decoded audio are filled with 0, since
+        the number of frames from FFprobe is only an estimation.
+
+        :returns: a ``numpy.ndarray`` of float32 with shape (nframes,
+        nchannels)
+        """
+
+        if self._proc is None or start < self._pos:
+            self._restart()
+        # skip frames before ``start``
+        while self._pos < start:
+            if not self._read_decoded(min(start - self._pos, 1048576)).size:
+                break
+        w = self._read_decoded(stop - start)
+        if w.shape[0] < stop - start:
+            w = np.concatenate((w, np.zeros(
+                (stop - start - w.shape[0], self._nchannels), np.float32)))
+        return w
+
+    def close(self):
+        """Terminate the decoder."""
+
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.stdout.close()
+            self._proc.wait()
+            self._proc = None
+
+
+def open_audio(path: Union[str, pathlib.Path]) -> Union[WaveMap, FFmpegAudio]:
+    """Open an audio file of any format for reading.
+
+    :param path: path of the audio file
+
+    :returns: a ``WaveMap`` object for an uncompressed WAV file, otherwise an
+    ``FFmpegAudio`` object
+    """
+
+    with open(path, 'rb') as f:
+        header = f.read(12)
+    if header[:4] == b'RIFF' and header[8:] == b'WAVE':
+        try:
+            return WaveMap(path)
+        except ValueError:
+            # e.g. compressed WAV files
+            pass
+    return FFmpegAudio(path)
+
+
+# Type aliases
+_WaveReader = Union[wave.Wave_read, WaveMap, FFmpegAudio]
+
+
+def read_frames(wr: _WaveReader, start: int, stop: int) -> np.ndarray:
+    """Read samples of frames from ``start`` to ``stop``.
+
+    :param wr: a ``Wave_read`` object or a reader from ``open_audio()``
+
+    :returns: a ``numpy.ndarray`` with shape (nframes, nchannels)
+    """
+
+    if not isinstance(wr, wave.Wave_read):
+        return wr.read(start, stop)
+    nchannels, sampwidth = wr.getnchannels(), wr.getsampwidth()
+    wr.setpos(int(start))
+    w = np.frombuffer(wr.readframes(int(stop - start)),
+                      dtype=INT_SAMPLE_DTYPES[sampwidth])
+    if sampwidth == 3:
+        w = np.reshape(w, (w.shape[0] // nchannels // 3, nchannels, 3))
+    else:
+        w = np.reshape(w, (w.shape[0] // nchannels, nchannels))
+    return decode_samples(w, sampwidth)
+
+
+def iter_frames(wr: _WaveReader, chunk: int = 1048576) -> Generator:
+    """Return a generator of samples of every ``chunk`` frames.
+
+    :param wr: a ``Wave_read`` object or a reader from ``open_audio()``
+
+    :param chunk: The number of frames in every iteration. (default: 1048576)
+
+    :return: a generator of ``numpy.ndarray`` with shape (nframes, nchannels)
+    """
+
+    nframes = wr.getnframes()
+    for start in range(0, nframes, chunk):
+        yield read_frames(wr, start, min(start + chunk, nframes))
+
+
+def get_peak(wr: _WaveReader, chunk: int = 1048576) -> float:
+    """Get the maximum absolute sample of all channels in a streaming pass.
+
+    :param wr: a ``Wave_read`` object or a reader from ``open_audio()``
+
+    :param chunk: The number of frames handled in every iteration.
+    (default: 1048576)
+    """
+
+    peak = 0.0
+    for w in iter_frames(wr, chunk):
+        if w.size:
+            # NOTE: ``abs()`` of an integer array overflows at its minimum.
+            peak = max(peak, -float(w.min()), float(w.max()))
+    return peak
+
+
+def get_wave_dots(
+    wr: _WaveReader,
+    peak: Union[float, None] = None
+) -> np.ndarray:
     """Get y-axis positions of wave dots of all channels.
     
-    :param wr: a ``Wave_read`` object
+    :param wr: a ``Wave_read`` object or a reader from ``open_audio()``
+
+    :param peak: The maximum absolute sample used for normalization (e.g.
+    from ``audio_stats.get_audio_stats()``). Use ``None`` to compute it.
+    (default: None)
 
     :return: a ``numpy.ndarray`` with all expected positions
     """
     
-    # get parameters of a wave file
-    params = wr.getparams()
-    # the number of channels, sample width, frame rate, the number of frames
-    nchannels, nframes = params[0], params[3]
-    # read frames as bytes
-    str_data = wr.readframes(nframes)
-    # convert bytes to ``numpy.ndarray``
-    w = np.frombuffer(str_data, dtype=np.int16)
-    # normalize the array, since the maximum is 32767
-    # NOTE: There are both positive and negative numbers in the array.
-    w = w * 1.0 / max(abs(w))
-    # reshape the array
+    # NOTE: must get max of abs of ``w`` first
+    max_abs_w = (peak if peak is not None else get_peak(wr)) or 1.0
+    # read all frames
     # NOTE: The first dimension is a period of one frame. The second dimension
     # is the number of channels.
-    w = np.reshape(w, (nframes, nchannels))
+    w = read_frames(wr, 0, wr.getnframes())
+    # normalize the array
+    # NOTE: There are both positive and negative numbers in the array.
+    w = w / max_abs_w
 
     return w
 
 
 def iter_wave_dots(
-    wr: wave.Wave_read,
-    chunk: int = 0
+    wr: _WaveReader,
+    chunk: int = 0,
+    peak: Union[float, None] = None
 ) -> Generator:
     """Return a generator of wave dots.
     
-    :param wr: a ``Wave_read`` object
+    :param wr: a ``Wave_read`` object or a reader from ``open_audio()``
     
     :param chunk: The number of handled wave dots in every iteration. 0 means
     returning all the wave dots. (default: 0)
 
+    :param peak: The maximum absolute sample used for normalization. Use
+    ``None`` to compute it. (default: None)
+
     :return: a generator object
     """
 
-    # get parameters of a wave file
-    params = wr.getparams()
-    # the number of channels, sample width, frame rate, the number of frames
-    nchannels, nframes = params[0], params[3]
+    # the number of frames
+    nframes = wr.getnframes()
 
     # validate chunk
     if not isinstance(chunk, int):
@@ -64,47 +385,345 @@ def iter_wave_dots(
     elif chunk == 0:
         chunk = nframes
 
-    # force to rewind
-    wr.rewind()
     # NOTE: must get max of abs of ``w`` first
-    max_abs_w = max(abs(np.frombuffer(wr.readframes(nframes), dtype=np.int16)))
-    # force to rewind
-    wr.rewind()
+    max_abs_w = (peak if peak is not None else get_peak(wr)) or 1.0
 
-    while True:
-        # reach end of file
-        if wr.tell() == nframes:
-            break
-        # read frames as bytes
-        str_data = wr.readframes(chunk)
-        # convert bytes to ``numpy.ndarray``
-        w = np.frombuffer(str_data, dtype=np.int16)
-        # normalize the array, since the maximum is 32767
+    for w in iter_frames(wr, chunk):
+        # normalize the array
         # NOTE: There are both positive and negative numbers in the array.
-        w = w * 1.0 / max_abs_w
-        # reshape the array
-        # NOTE: The first dimension is a period of one frame. The second
-        # dimension is the number of channels.
-        w = np.reshape(w, (w.shape[0] // nchannels, nchannels))
-        yield w
+        yield w / max_abs_w
+
+
+# Indices of statistics in the last dimension of a wave envelope
+ENVELOPE_MIN = 0
+ENVELOPE_MAX = 1
+ENVELOPE_RMS = 2
+
+
+def get_wave_envelope(
+    wr: _WaveReader,
+    frames_per_px: float,
+    ncolumns: int,
+    chunk: int = 65536,
+    peak: Union[float, None] = None
+) -> np.ndarray:
+    """Get the normalized envelope of waves of all channels at every pixel
+    column.
+
+    Every pixel column takes a bucket of ``frames_per_px`` audio frames, and
+    the minimum, maximum and RMS of every bucket are computed by
+    ``numpy.ufunc.reduceat()``, so peaks between columns are never lost.
+
+    :param wr: a ``Wave_read`` object or a reader from ``open_audio()``
+
+    :param frames_per_px: the number of audio frames every pixel column takes,
+    which is not necessarily an integer
+    NOTE: If it is less than 1, a column without any frame of its own takes
+    the frame at its start, so that the wave is never broken into a comb.
+
+    :param ncolumns: the number of pixel columns
+    NOTE: Columns after the end of audio are filled with 0.
+
+    :param chunk: The number of handled columns in every iteration.
+    (default: 65536)
+
+    :param peak: The maximum absolute sample used for normalization. Use
+    ``None`` for the peak of the envelope itself. (default: None)
+
+    :return: a ``numpy.ndarray`` of float32 with shape (ncolumns, nchannels,
+    3), whose last dimension is indexed by ``ENVELOPE_MIN``, ``ENVELOPE_MAX``
+    and ``ENVELOPE_RMS``
+    """
+
+    # the number of channels, the number of frames
+    nchannels, nframes = wr.getnchannels(), wr.getnframes()
+
+    # bucket boundaries of all columns
+    bounds = np.floor(np.arange(ncolumns + 1) * frames_per_px).astype(np.int64)
+    np.minimum(bounds, nframes, out=bounds)
+    envelope = np.zeros((ncolumns, nchannels, 3), dtype=np.float32)
+    for begin in range(0, ncolumns, chunk):
+        end = min(begin + chunk, ncolumns)
+        b = bounds[begin:end + 1]
+        # reach end of audio
+        if b[0] >= nframes:
+            break
+        counts = np.diff(b)
+        # NOTE: ``reduceat()`` can't handle empty buckets, but skipping them
+        # keeps the others unchanged since an empty bucket shares its start
+        # with the next one.
+        nonempty = counts > 0
+        indices = b[:-1][nonempty] - b[0]
+        # NOTE: One more frame is read for an empty bucket at the end, but it
+        # is excluded from ``reduceat()`` which reduces to the end of array.
+        seg = read_frames(wr, b[0], min(b[-1] + 1, nframes)).astype(
+            np.float32)
+        part = envelope[begin:end]
+        if indices.size:
+            bucketed = seg[:b[-1] - b[0]]
+            part[nonempty, :, ENVELOPE_MIN] = np.minimum.reduceat(bucketed,
+                                                                  indices)
+            part[nonempty, :, ENVELOPE_MAX] = np.maximum.reduceat(bucketed,
+                                                                  indices)
+            part[nonempty, :, ENVELOPE_RMS] = np.sqrt(
+                np.add.reduceat(bucketed * bucketed, indices) /
+                counts[nonempty, np.newaxis])
+        # columns narrower than a frame take the frame at their start
+        empty = ~nonempty & (b[:-1] < nframes)
+        if empty.any():
+            dots = seg[b[:-1][empty] - b[0]]
+            part[empty, :, ENVELOPE_MIN] = dots
+            part[empty, :, ENVELOPE_MAX] = dots
+            part[empty, :, ENVELOPE_RMS] = np.abs(dots)
+
+    # normalize the envelope with the peak of all channels
+    if peak is None:
+        peak = max(-float(envelope[..., ENVELOPE_MIN].min()),
+                   float(envelope[..., ENVELOPE_MAX].max()))
+    envelope /= peak or 1.0
+
+    return envelope
+
+
+def get_envelope_peaks(envelope: np.ndarray) -> np.ndarray:
+    """Get absolute peaks of an envelope from ``get_wave_envelope()``.
+
+    :return: a ``numpy.ndarray`` of float32 with shape (ncolumns, nchannels)
+    """
+
+    return np.maximum(-envelope[..., ENVELOPE_MIN],
+                      envelope[..., ENVELOPE_MAX])
+
+
+def get_stereo_peaks(peaks: np.ndarray) -> np.ndarray:
+    """Fold absolute peaks of any number of channels into two sides.
+
+    A mono track is shown on both sides. Otherwise, channels with even
+    indices (e.g. front left of stereo and 5.1 layouts) are folded into the
+    first side and the others into the second side by taking the maximum.
+
+    :param peaks: a ``numpy.ndarray`` with shape (ncolumns, nchannels) from
+    ``get_envelope_peaks()``
+
+    :return: a ``numpy.ndarray`` with shape (ncolumns, 2)
+    """
+
+    if peaks.shape[1] == 1:
+        return np.repeat(peaks, 2, axis=1)
+    return np.stack((peaks[:, 0::2].max(axis=1), peaks[:, 1::2].max(axis=1)),
+                    axis=1)
+
+
+def get_spectrum(
+    wr: _WaveReader,
+    frames_per_window: float,
+    nwindows: int,
+    nbins: int = 64,
+    window_size: int = 2048,
+    fmin: float = 40.0,
+    fmax: Union[float, None] = None,
+    db_range: float = 60.0,
+    smoothing: float = 0.75,
+    chunk: int = 256
+) -> np.ndarray:
+    """Get the normalized spectrum of the mixed-down track at every window.
+
+    Every window (e.g. a video frame) takes ``frames_per_window`` audio
+    frames, and a Hann-windowed ``numpy.fft.rfft()`` of ``window_size``
+    frames centered at the middle of it is computed for a batch of ``chunk``
+    windows at once. Powers are averaged into ``nbins`` log-frequency bands
+    by ``numpy.ufunc.reduceat()`` and converted to decibels relative to the
+    loudest band of the track, so rendering a frame is only drawing heights.
+
+    :param wr: a ``Wave_read`` object or a reader from ``open_audio()``
+
+    :param frames_per_window: the number of audio frames every window takes,
+    which is not necessarily an integer
+
+    :param nwindows: the number of windows
+    NOTE: Windows after the end of audio are filled with 0.
+
+    :param nbins: the number of log-frequency bands (default: 64)
+
+    :param window_size: the number of audio frames of every FFT
+    (default: 2048)
+
+    :param fmin: the lowest frequency in Hz (default: 40.0)
+
+    :param fmax: The highest frequency in Hz. Use ``None`` for the Nyquist
+    frequency. (default: None)
+
+    :param db_range: Decibels below the loudest band shown as 0.
+    (default: 60.0)
+
+    :param smoothing: The factor of falling bands every window, i.e. a band
+    falls to at least ``smoothing`` times its previous value, while rising
+    is immediate. Use 0 for no smoothing. (default: 0.75)
+
+    :param chunk: The number of handled windows in every iteration.
+    (default: 256)
+
+    :return: a ``numpy.ndarray`` of float32 with shape (nwindows, nbins) from
+    0 to 1
+    """
+
+    framerate, nframes = wr.getframerate(), wr.getnframes()
+    if fmax is None:
+        fmax = framerate / 2
+
+    # Step 1: Map FFT bins to log-frequency bands
+    # NOTE: A band narrower than an FFT bin takes the bin it falls in.
+    nfft = window_size // 2 + 1
+    edges = np.round(np.geomspace(fmin, fmax, nbins + 1) * window_size /
+                     framerate).astype(np.int64)
+    stop = int(min(max(edges[-1], 1), nfft))
+    starts = np.minimum(edges[:-1], stop - 1)
+    counts = np.diff(np.append(starts, stop))
+    counts[counts == 0] = 1
+    window = np.hanning(window_size).astype(np.float32)
+
+    # Step 2: Compute powers of bands of windows in batches
+    offsets = np.floor((np.arange(nwindows) + 0.5) * frames_per_window
+                       ).astype(np.int64) - window_size // 2
+    spectrum = np.zeros((nwindows, nbins), dtype=np.float32)
+    # NOTE: Windows of consecutive batches overlap, so the audio of the
+    # previous batch is kept and audio is read sequentially.
+    last_seg = np.zeros(0, dtype=np.float32)
+    last_lo = offsets[0] if nwindows else 0
+    for begin in range(0, nwindows, chunk):
+        end = min(begin + chunk, nwindows)
+        lo, hi = offsets[begin], offsets[end - 1] + window_size
+        if lo >= nframes:
+            break
+        seg = np.zeros(hi - lo, dtype=np.float32)
+        overlap = last_lo + len(last_seg) - lo
+        if overlap > 0:
+            seg[:overlap] = last_seg[lo - last_lo:]
+        a, b = max(lo + max(overlap, 0), 0), min(hi, nframes)
+        if a < b:
+            seg[a - lo:b - lo] = read_frames(wr, a, b).astype(
+                np.float32).mean(axis=1)
+        last_seg, last_lo = seg, lo
+
+        windows = seg[(offsets[begin:end] - lo)[:, np.newaxis] +
+                      np.arange(window_size)] * window
+        bins = np.fft.rfft(windows, axis=1)[:, :stop]
+        power = bins.real * bins.real + bins.imag * bins.imag
+        spectrum[begin:end] = np.add.reduceat(power, starts, axis=1) / counts
+
+    # Step 3: Convert to normalized decibels
+    ref = float(spectrum.max()) if nwindows else 0.0
+    if ref <= 0:
+        return np.zeros((nwindows, nbins), dtype=np.float32)
+    np.maximum(spectrum / ref, 1e-12, out=spectrum)
+    spectrum = np.clip(1 + 10 * np.log10(spectrum) / db_range, 0, 1).astype(
+        np.float32)
+
+    # Step 4: Smooth falling bands
+    if smoothing > 0:
+        for i in range(1, nwindows):
+            np.maximum(spectrum[i], spectrum[i - 1] * smoothing,
+                       out=spectrum[i])
+
+    return spectrum
+
+
+def _read_dots(
+    source: Union[np.ndarray, _WaveReader],
+    start: int,
+    stop: int
+) -> np.ndarray:
+    """Read wave dots from an array (e.g. ``numpy.memmap``) or samples from a
+    reader.
+    """
+
+    if isinstance(source, np.ndarray):
+        return source[start:stop]
+    return read_frames(source, start, stop)
+
+
+def get_minmax_dots(
+    source: Union[np.ndarray, _WaveReader],
+    start: int,
+    stop: int,
+    nbuckets: int,
+    chunk: int = 1048576
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Decimate wave dots from ``start`` to ``stop`` into the minimum and
+    maximum of every bucket, so a line through them looks the same as a line
+    through all dots when every bucket takes at most one pixel column.
+
+    :param source: a ``numpy.ndarray`` (e.g. ``numpy.memmap``) with shape
+    (nframes, nchannels) of wave dots, or a reader from ``open_audio()``
+    whose samples are returned as they are
+
+    :param nbuckets: the number of buckets (e.g. the width of the axes in
+    pixels)
+
+    :param chunk: The number of frames handled in every iteration.
+    (default: 1048576)
+
+    :returns: a tuple (positions, dots), where ``positions`` has shape (n,)
+    of frame positions and ``dots`` has shape (n, nchannels)
+    NOTE: If there are no more than two dots in every bucket, all dots are
+    returned without decimation.
+    """
+
+    nframes = stop - start
+    if nframes <= 2 * nbuckets:
+        return (np.arange(start, stop),
+                np.asarray(_read_dots(source, start, stop)))
+
+    # NOTE: Every bucket has at least 2 frames here, so ``reduceat()`` never
+    # meets an empty bucket.
+    bounds = start + (np.arange(nbuckets + 1) * nframes // nbuckets)
+    step = max(1, chunk * nbuckets // nframes)
+    parts = []
+    for begin in range(0, nbuckets, step):
+        end = min(begin + step, nbuckets)
+        b = bounds[begin:end + 1]
+        seg = np.asarray(_read_dots(source, b[0], b[-1]))
+        indices = b[:-1] - b[0]
+        # interleave minimums and maximums of buckets
+        parts.append(np.stack((np.minimum.reduceat(seg, indices),
+                               np.maximum.reduceat(seg, indices)), axis=1))
+    dots = np.concatenate(parts).reshape(2 * nbuckets, -1)
+    return (np.repeat(bounds[:-1], 2), dots)
 
 
 def show_wave(
-    wave_dots: np.ndarray,
+    wave_dots: Union[np.ndarray, _WaveReader],
     framerate: int,
     channels: Union[Iterable[int], int, None] = None
 ):
     """Show the figure of waves.
-    
-    :param wave_dots: a ``numpy.ndarray`` of wave dots
+
+    Waves are decimated to the minimum and maximum of every pixel column by
+    ``get_minmax_dots()``, and decimated again when the view is zoomed or
+    panned, so long recordings are shown without plotting every dot.
+
+    :param wave_dots: a ``numpy.ndarray`` of wave dots (e.g. a memory-mapped
+    one), or a reader from ``open_audio()`` whose samples are normalized by
+    ``get_peak()``
 
     :param framerate: frame rate of the waves
 
     :param channels: a list of integers or an integer of channels
     """
 
+    # NOTE: Import it lazily, since importing ``matplotlib.pyplot`` is slow
+    # and only needed for showing figures.
+    import matplotlib.pyplot as plt
+
     # check which wave figure of channels should be shown
-    max_channels = wave_dots.shape[1]
+    if isinstance(wave_dots, np.ndarray):
+        max_channels = wave_dots.shape[1]
+        nframes = wave_dots.shape[0]
+        scale = 1.0
+    else:
+        max_channels = wave_dots.getnchannels()
+        nframes = wave_dots.getnframes()
+        scale = 1.0 / (get_peak(wave_dots) or 1.0)
     if channels is None:
         channels = range(1, max_channels + 1)
     elif isinstance(channels, int):
@@ -114,14 +733,35 @@ def show_wave(
     for channel in channels:
         if not (1 <= channel <= max_channels):
             raise ValueError('channel out of index')
-    
-    nframes = wave_dots.shape[0]
+
+    channels = list(channels)
     len_channels = len(channels)
-    x_pos = np.arange(0, nframes) * 1.0 / framerate
-    plt.figure()
-    for idx, channel in enumerate(channels):
-        plt.subplot(len_channels, 1, idx + 1)
-        plt.plot(x_pos, wave_dots[:, idx])
-        plt.xlabel('Time (s)')
-        plt.title('Channel %d' % (idx + 1))
-    plt.show()
\ No newline at end of file
+    fig, axes = plt.subplots(len_channels, 1, sharex=True, squeeze=False)
+    axes = axes[:, 0]
+    lines = []
+    for ax, channel in zip(axes, channels):
+        lines.append(ax.plot([], [])[0])
+        ax.set_xlabel('Time (s)')
+        ax.set_title('Channel %d' % channel)
+        ax.set_ylim(-1.05, 1.05)
+    # NOTE: Every dot is one sample of the column index ``channel - 1``.
+    columns = [channel - 1 for channel in channels]
+
+    def update(*args):
+        # Decimate dots in the current view to its width in pixels
+        left, right = axes[0].get_xlim()
+        start = min(max(int(np.floor(left * framerate)), 0), nframes)
+        stop = min(max(int(np.ceil(right * framerate)) + 1, start), nframes)
+        nbuckets = max(1, int(axes[0].bbox.width))
+        positions, dots = get_minmax_dots(wave_dots, start, stop, nbuckets)
+        x_pos = positions / framerate
+        for line, column in zip(lines, columns):
+            line.set_data(x_pos, dots[:, column] * scale)
+        fig.canvas.draw_idle()
+
+    # NOTE: Axes share the x axis, so watching the first one is enough.
+    axes[0].set_xlim(0, max(nframes - 1, 1) / framerate)
+    update()
+    axes[0].callbacks.connect('xlim_changed', update)
+    fig.canvas.mpl_connect('resize_event', update)
+    plt.show()
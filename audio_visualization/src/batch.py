@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+
+"""A module for rendering many tracks in batch from a manifest.
+
+A manifest is a JSON file like this, where relative paths are relative to
+the directory of the manifest, and every job overrides ``defaults``::
+
+    {
+        "defaults": {"size": [1920, 1080], "fps": 60, "lrcfiles": {}},
+        "jobs": [
+            {
+                "name": "track1",
+                "outfile": "dist/track1.mp4",
+                "audiofile": "audio/track1.flac",
+                "backgroundfile": "images/track1.jpg",
+                "lrcfiles": {"zh": "lrc/track1_zh.lrc"}
+            }
+        ]
+    }
+
+Usage (in the directory ``audio_visualization``)::
+
+    python -m src.batch jobs.json --log-dir build/logs
+
+Drafts (see ``generate_video.preview()``) of some jobs, e.g. to check
+timings of subtitles from 01:00 to 01:30, are rendered next to their
+outfiles with the suffix ".preview"::
+
+    python -m src.batch jobs.json --only track1 --preview --window 60 90
+"""
+
+
+import argparse
+import contextlib
+import json
+import os
+import pathlib
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Tuple, Union
+
+from .generate_video import generate, preview
+
+
+# Default parameters of every job, the same as ``wave.py``
+DEFAULT_JOB = {
+    'size': [1920, 1080],
+    'fps': 60,
+    'vcodec': 'h264',
+    'bv': 10000,
+    'speed': 5,
+    'acodec': 'aac',
+    'filter_complex': 'adelay=delays=6000:all=1',
+    'lrcfiles': {},
+    'segment_dir': None,
+    'segment_frames': 3600,
+    'background_fit': 'cover'
+}
+REQUIRED_KEYS = ('outfile', 'audiofile', 'backgroundfile')
+# Keys of paths resolved relative to the manifest
+PATH_KEYS = ('outfile', 'audiofile', 'backgroundfile', 'segment_dir')
+
+
+def load_jobs(path: Union[str, pathlib.Path]) -> List[Dict[str, Any]]:
+    """Load jobs from a manifest.
+
+    :returns: a list of dicts of job parameters, where every job has a unique
+    ``name`` (default: the stem of ``outfile``) and absolute paths
+    """
+
+    path = pathlib.Path(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    base = path.resolve().parent
+    defaults = {**DEFAULT_JOB, **manifest.get('defaults', {})}
+    jobs = []
+    names = set()
+    for i, d in enumerate(manifest['jobs']):
+        job = {**defaults, **d}
+        for k in REQUIRED_KEYS:
+            if k not in job:
+                raise ValueError('missing key of job %d: %s' % (i, k))
+        for k in PATH_KEYS:
+            if job[k] is not None:
+                job[k] = str(base / job[k])
+        job['lrcfiles'] = {lang: str(base / v)
+                           for lang, v in job['lrcfiles'].items()}
+        job.setdefault('name', pathlib.Path(job['outfile']).stem)
+        if job['name'] in names:
+            raise ValueError('duplicate job name: %s' % job['name'])
+        names.add(job['name'])
+        jobs.append(job)
+    return jobs
+
+
+def default_workers(threads: int) -> int:
+    """Get the number of jobs running at the same time.
+
+    NOTE: Every job takes one core to render frames and ``threads`` cores
+    for FFmpeg.
+    """
+
+    return max(1, (os.cpu_count() or 1) // (threads + 1))
+
+
+def run_job(
+    job: Dict[str, Any],
+    log_dir: Union[str, pathlib.Path],
+    threads: Union[int, None] = None,
+    cache_dir: Union[str, pathlib.Path, None] = None,
+    font_path: Union[List[str], None] = None,
+    draft: bool = False,
+    window: Union[Tuple[float, float], None] = None
+) -> Dict[str, Any]:
+    """Run a job in the current process.
+
+    Fonts and backgrounds are cached in the process and envelopes are cached
+    in ``cache_dir``, so they are shared by jobs in the same worker.
+
+    :param draft: Whether to render a draft by ``preview()`` into the
+    outfile with the suffix ".preview", without segments. (default: False)
+
+    :param window: a tuple (start, end) of seconds of the video to render
+    (default: None)
+
+    :returns: a dict of the status ("done" or "failed") and throughput of
+    the job
+    NOTE: Throughput is only reported for jobs done.
+    """
+
+    log_dir = pathlib.Path(log_dir)
+    stem = job['name'] + ('.preview' if draft else '')
+    log_path = log_dir / ('%s.log' % stem)
+    report_path = log_dir / ('%s.report.json' % stem)
+    outfile = job['outfile']
+    if draft:
+        outfile = pathlib.Path(outfile)
+        outfile = str(outfile.with_name(
+            '%s.preview%s' % (outfile.stem, outfile.suffix)))
+    result = {'name': job['name'], 'outfile': outfile, 'log': str(log_path)}
+    # NOTE: A report left by an earlier run must never be taken as the
+    # report of this one.
+    try:
+        report_path.unlink()
+    except FileNotFoundError:
+        pass
+    start = time.perf_counter()
+    try:
+        with open(log_path, 'w', encoding='utf-8') as fp, \
+                contextlib.redirect_stdout(fp):
+            args = (outfile, tuple(job['size']), job['fps'], job['vcodec'],
+                    job['bv'], job['speed'], job['audiofile'], job['acodec'],
+                    job['filter_complex'], job['backgroundfile'],
+                    job['lrcfiles'], fp, fp)
+            if draft:
+                ok = preview(*args, window=window, report_file=report_path,
+                             threads=threads, cache_dir=cache_dir,
+                             font_path=font_path,
+                             background_fit=job['background_fit'])
+            else:
+                # NOTE: A window is rendered at once instead of segments.
+                segment_dir = job['segment_dir'] if window is None else None
+                ok = generate(*args, report_path, segment_dir,
+                              job['segment_frames'], threads=threads,
+                              cache_dir=cache_dir, font_path=font_path,
+                              window=window,
+                              background_fit=job['background_fit'])
+        result['status'] = 'done' if ok else 'failed'
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = '%s: %s' % (type(e).__name__, e)
+    result['seconds'] = time.perf_counter() - start
+    if result['status'] != 'done':
+        return result
+
+    try:
+        with open(report_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        result['nframes'] = report['nframes']
+        result['fps'] = report['nframes'] / result['seconds']
+    except (OSError, ValueError, KeyError):
+        pass
+    return result
+
+
+def run_batch(
+    jobs: List[Dict[str, Any]],
+    log_dir: Union[str, pathlib.Path],
+    workers: Union[int, None] = None,
+    threads: int = 2,
+    cache_dir: Union[str, pathlib.Path, None] = None,
+    font_path: Union[List[str], None] = None,
+    callback=None,
+    draft: bool = False,
+    window: Union[Tuple[float, float], None] = None
+) -> Dict[str, Any]:
+    """Run jobs over a pool of worker processes.
+
+    :param jobs: a list from ``load_jobs()``
+
+    :param log_dir: the directory of logs and reports of jobs
+
+    :param workers: The number of worker processes. Use ``None`` for
+    ``default_workers(threads)``. (default: None)
+
+    :param threads: the number of threads of FFmpeg of every job (default: 2)
+
+    :param cache_dir: The directory of cached audio analyses shared by jobs.
+    Use ``None`` for directories of audio files. (default: None)
+
+    :param font_path: directories searched first for fonts (default: None)
+
+    :param callback: a function called with the result dict of every job
+    when it ends (default: None)
+
+    See ``run_job()`` for ``draft`` and ``window``.
+
+    :returns: a JSON-serializable summary of all jobs
+    """
+
+    log_dir = pathlib.Path(log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    if cache_dir is not None:
+        pathlib.Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    for job in jobs:
+        pathlib.Path(job['outfile']).parent.mkdir(parents=True, exist_ok=True)
+    if workers is None:
+        workers = default_workers(threads)
+
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(run_job, job, log_dir, threads, cache_dir,
+                                   font_path, draft, window)
+                   for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if callback is not None:
+                callback(result)
+    elapsed = time.perf_counter() - start
+
+    nframes = sum(r.get('nframes', 0) for r in results)
+    return {
+        'workers': workers,
+        'threads': threads,
+        'elapsed': elapsed,
+        'done': sum(r['status'] == 'done' for r in results),
+        'failed': sum(r['status'] != 'done' for r in results),
+        'fps': nframes / elapsed if elapsed > 0 else 0.0,
+        'jobs': results
+    }
+
+
+def main(argv: Union[List[str], None] = None):
+    parser = argparse.ArgumentParser(
+        description='Render many tracks in batch from a manifest.')
+    parser.add_argument('manifest', help='path of the JSON manifest of jobs')
+    parser.add_argument('--log-dir', default='build/logs',
+                        help='directory of logs and reports of jobs')
+    parser.add_argument('--summary', default=None,
+                        help='path of the JSON summary of all jobs')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of jobs running at the same time')
+    parser.add_argument('--threads', type=int, default=2,
+                        help='number of threads of FFmpeg of every job')
+    parser.add_argument('--cache-dir', default=None,
+                        help='directory of cached audio analyses')
+    parser.add_argument('--font-path', nargs='+', default=None,
+                        help='directories searched first for fonts')
+    parser.add_argument('--only', nargs='+', default=None,
+                        help='names of jobs to run')
+    parser.add_argument('--preview', action='store_true',
+                        help='render fast drafts instead of final videos')
+    parser.add_argument('--window', nargs=2, type=float, default=None,
+                        metavar=('START', 'END'),
+                        help='seconds of the video to render')
+    args = parser.parse_args(argv)
+
+    jobs = load_jobs(args.manifest)
+    if args.only is not None:
+        jobs = [job for job in jobs if job['name'] in args.only]
+    counter = {'n': 0}
+
+    def callback(result: Dict[str, Any]):
+        counter['n'] += 1
+        line = '[%d/%d] %s %s %.1fs' % (counter['n'], len(jobs),
+                                        result['name'], result['status'],
+                                        result['seconds'])
+        if 'fps' in result:
+            line += ' %.1f fps' % result['fps']
+        if 'error' in result:
+            line += ' ' + result['error']
+        print(line, flush=True)
+
+    window = tuple(args.window) if args.window is not None else None
+    summary = run_batch(jobs, args.log_dir, args.workers, args.threads,
+                        args.cache_dir, args.font_path, callback, args.preview,
+                        window)
+    print('%d done, %d failed, %.1fs, %.1f fps' % (
+        summary['done'], summary['failed'], summary['elapsed'],
+        summary['fps']))
+    if args.summary is not None:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
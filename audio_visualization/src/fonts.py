@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""A module for finding and loading fonts lazily."""
+
+
+import os
+import pathlib
+from functools import lru_cache
+from typing import Iterable, List, Union
+
+from PIL import ImageFont
+
+
+# Environment variable of extra font directories, separated by ``os.pathsep``
+FONT_PATH_ENV = 'AUDIO_VISUALIZATION_FONT_PATH'
+# The directory of fonts shipped with the project
+PROJECT_FONT_DIR = pathlib.Path(__file__).resolve().parents[1] / 'fonts'
+
+# Type aliases
+_Path = Union[str, pathlib.Path]
+
+
+def get_font_search_path(
+    extra: Union[Iterable[_Path], None] = None
+) -> List[pathlib.Path]:
+    """Get directories searched for fonts in order.
+
+    :param extra: Directories searched first. (default: None)
+
+    :returns: a list of ``extra``, directories in the environment variable
+    ``AUDIO_VISUALIZATION_FONT_PATH``, ``fonts`` in the current directory and
+    ``fonts`` of the project
+    """
+
+    dirs = [pathlib.Path(d) for d in (extra or [])]
+    env = os.environ.get(FONT_PATH_ENV)
+    if env:
+        dirs.extend(pathlib.Path(d) for d in env.split(os.pathsep) if d)
+    dirs.extend([pathlib.Path('fonts'), PROJECT_FONT_DIR])
+    return dirs
+
+
+def find_font(
+    name: _Path,
+    search_path: Union[Iterable[_Path], None] = None
+) -> pathlib.Path:
+    """Find a font file.
+
+    :param name: a path of the font file, or a file name searched in
+    ``get_font_search_path(search_path)`` if the path does not exist
+
+    :param search_path: extra directories searched first (default: None)
+
+    :returns: the resolved path of the font file
+    """
+
+    path = pathlib.Path(name)
+    if path.is_file():
+        return path.resolve()
+    for d in get_font_search_path(search_path):
+        candidate = d / path
+        if candidate.is_file():
+            return candidate.resolve()
+    raise FileNotFoundError('font not found: %s' % name)
+
+
+@lru_cache(maxsize=None)
+def _load_font(path: str, size: int, index: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(path, size, index)
+
+
+def load_font(
+    name: _Path,
+    size: int,
+    index: int = 0,
+    search_path: Union[Iterable[_Path], None] = None
+) -> ImageFont.FreeTypeFont:
+    """Load a font, which is cached by (path, size, index) in the process.
+
+    See ``find_font()`` for ``name`` and ``search_path``.
+
+    :param size: size of the font
+
+    :param index: index of the font face in a collection (e.g. .ttc) file
+    (default: 0)
+
+    :returns: an ``ImageFont.FreeTypeFont`` object
+    NOTE: The returned object is shared, so never modify it.
+    """
+
+    return _load_font(str(find_font(name, search_path)), size, index)
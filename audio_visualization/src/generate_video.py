@@ -3,29 +3,47 @@
 """Main script of generating a video."""
 
 
-from functools import partial
+from functools import lru_cache, partial
+import json
 import math
 import pathlib
 import time
-import wave
 from io import IOBase
-from typing import Callable, Dict, List, Tuple, Union
+from typing import Callable, Dict, Iterable, List, Tuple, Union
 
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 
-from .video_conductor import VideoConductor
-from .text_effects import SrtWithFadeLine, parse_lrc_to_srt, parse_srt_with_fade
-from .text_effects import fade_in, fade_out
+from .audio_stats import get_cached_spectrum, get_cached_wave_envelope
+from .audio_stats import get_file_key
+from .audio_visualization import get_envelope_peaks, get_stereo_peaks
+from .audio_visualization import open_audio
+from .compositor import Compositor, Fader
+from .fonts import load_font
+from .plots import SpectrumLayer, WaveLayer
+from .profiling import RenderProfiler, merge_reports
+from .segments import SegmentManifest, concat_segments
+from .video_conductor import REPEAT_FRAME, VideoConductor, order_independent
+from .text_effects import SpriteCache, SrtWithFadeLine, SubtitleTimeline
+from .text_effects import render_text
+from .text_effects import parse_lrc_to_srt, parse_srt_with_fade
 
 
 AVAILABLE_LRC_LANGS = ['zh', 'ja']
+# Font file names and sizes of subtitles
+# NOTE: Fonts are found by ``fonts.find_font()`` and loaded only when used.
 DEFAULT_FONTS = {
     # STKaiti
-    'zh': ImageFont.truetype('./fonts/DFSHAONVW5.TTC', 72),
+    'zh': ('DFSHAONVW5.TTC', 72),
     # UD Digi Kyokasho N-R
-    'ja': ImageFont.truetype('./fonts/UDDIGIKYOKASHON-R.TTC', 72)
+    'ja': ('UDDIGIKYOKASHON-R.TTC', 72)
 }
+# Parameters of drafts rendered by ``preview()``
+PREVIEW_SCALE = 1 / 3
+PREVIEW_FPS = 20
+PREVIEW_PRESET = 'ultrafast'
+# Policies fitting backgrounds into frames. See ``load_background()``.
+AVAILABLE_BACKGROUND_FITS = ['cover', 'contain', 'stretch']
 
 
 def generate(
@@ -34,23 +52,113 @@ def generate(
     fps: int,
     vcodec: str,
     bv: int,
-    speed: int,
+    speed: float,
     audiofile: Union[str, pathlib.Path],
     acodec: Union[str, None],
     filter_complex: Union[str, None],
     backgroundfile: Union[str, pathlib.Path],
     lrcfiles: Dict[str, Union[str, pathlib.Path]],
     stdout: Union[int, IOBase, None],
-    stderr: Union[int, IOBase, None]
-) -> Image.Image:
+    stderr: Union[int, IOBase, None],
+    report_file: Union[str, pathlib.Path, None] = None,
+    segment_dir: Union[str, pathlib.Path, None] = None,
+    segment_frames: int = 3600,
+    segments: Union[Iterable[int], None] = None,
+    concat: bool = True,
+    threads: Union[int, None] = None,
+    cache_dir: Union[str, pathlib.Path, None] = None,
+    font_path: Union[List[Union[str, pathlib.Path]], None] = None,
+    workers: int = 1,
+    plot: str = 'wave',
+    antialias: bool = False,
+    scale: float = 1.0,
+    preset: Union[str, None] = None,
+    window: Union[Tuple[float, float], None] = None,
+    background_fit: str = 'cover'
+) -> bool:
     """A function to generate the final creation.
     
     NOTE: We assume that all parameters are valid.
+
+    :param report_file: The path of a JSON report of timings, including
+    timings of stages "fade_in", "wave" (or "spectrum"), "subtitle",
+    "compose" and "still".
+    Use ``None`` to skip it. (default: None)
+    NOTE: With ``segment_dir``, reports of segments rendered by this call are
+    merged, and kept under "parts" by indices of segments.
+    NOTE: Stage timings are parts of the "genfunc" timing and may be nested,
+    e.g. "still" includes "wave" and "compose" of the same frames.
+
+    :param segment_dir: The directory of segment files and their manifest.
+    If it is not ``None``, frames are rendered into segments without audio,
+    segments already done are skipped, and all segments are concatenated
+    with the audio into ``outfile`` at last. Use ``None`` to render
+    ``outfile`` at once. (default: None)
+
+    :param segment_frames: the number of frames of every segment
+    (default: 3600)
+
+    :param segments: Indices of segments rendered by this call, e.g. to
+    spread segments across processes. Use ``None`` for all. (default: None)
+
+    :param concat: Whether to concatenate segments if all of them are done.
+    (default: True)
+
+    :param threads: The number of threads of FFmpeg. Use ``None`` to let
+    FFmpeg decide. (default: None)
+
+    :param cache_dir: The directory of cached envelopes and spectra of audio
+    files, which may be shared by many jobs. Use ``None`` for the directory
+    of the audio file. (default: None)
+
+    :param font_path: Directories searched first for fonts of subtitles. See
+    ``fonts.get_font_search_path()`` for others. (default: None)
+
+    :param workers: The number of worker processes rendering frames. See
+    ``VideoConductor`` for details. (default: 1)
+    NOTE: Stage timings are lost if it is more than 1.
+
+    :param plot: The form of visualization, "wave" for a scrolling waveform
+    or "spectrum" for bars of log-frequency bands. (default: "wave")
+
+    :param antialias: whether to anti-alias edges of the wave (default: False)
+
+    :param scale: The scale of the rendered video. ``size`` (rounded to even
+    numbers), the background, fonts and shadows of subtitles and ``speed``
+    are scaled together, so the layout is the same as the full-size video.
+    NOTE: ``speed`` is never rounded, so the wave crosses the anchor line in
+    the same time as in the full-size video. (default: 1.0)
+
+    :param preset: FFmpeg encoder preset. Use ``None`` for the default of
+    the encoder. (default: None)
+
+    :param window: A tuple (start, end) of seconds of the video to render
+    only frames between them, with the audio of the same period. Use
+    ``None`` for the whole video. It can not be used with ``segment_dir``.
+    (default: None)
+
+    :param background_fit: How the background is resampled to ``size`` once
+    before rendering. See ``load_background()`` for details.
+    (default: "cover")
+
+    :returns: whether ``outfile`` has been generated successfully, or whether
+    all rendered segments are done if ``concat`` is False
     """
 
+    if window is not None and segment_dir is not None:
+        raise ValueError('window can not be used with segment_dir')
+
     # Step 1: Add background image
-    with Image.open(backgroundfile) as _:
-        bg_orig = _.convert('RGBA')
+    # NOTE: Geometry below is derived from ``size``, so scaling ``size``
+    # scales the anchor line and the wave as well.
+    if scale != 1:
+        size = (2 * max(1, round(size[0] * scale / 2)),
+                2 * max(1, round(size[1] * scale / 2)))
+        speed = speed * scale
+    # NOTE: The background is resampled to ``size`` once, so frames are
+    # composed and piped at the output size whatever the size of the image
+    # is. The cached background is shared, so never modify it in place.
+    bg_orig = load_background(backgroundfile, size, background_fit)
     bg = bg_orig.copy()
     draw_bg = ImageDraw.Draw(bg)
     
@@ -65,17 +173,38 @@ def generate(
                       (255, 255, 255, 255))
 
     # Step 3: Pre-process wave (default: 1/5 of height)
-    wr = wave.open(audiofile, 'rb')
-    nframes = wr.getnframes()
-    framerate = wr.getframerate()
-    wave_max_height = size[1] // 5
-    audio_frames_per_px = framerate / fps / speed
-    # NOTE: must get max of abs of ``w`` first
-    max_abs_w = max(abs(np.frombuffer(wr.readframes(nframes), dtype=np.int16)))
-    # force to rewind
-    wr.rewind()
+    # NOTE: The length of the track is read from the header (or probed) only,
+    # and the same reader decodes the track if the envelope (or spectrum) is
+    # not cached yet, so the track is decoded at most once.
+    wr = open_audio(audiofile)
+    try:
+        nframes = wr.getnframes()
+        framerate = wr.getframerate()
+        wave_max_height = size[1] // 5
+        audio_frames_per_px = framerate / fps / speed
+        video_nframes = math.ceil(nframes / framerate * fps)
+        # NOTE: The envelope (or spectrum) is cached in ``cache_dir``, so
+        # re-rendering the same track never decodes it again.
+        if plot == 'wave':
+            wave_envelope = get_cached_wave_envelope(audiofile,
+                                                     audio_frames_per_px,
+                                                     cache_dir, wr)
+        elif plot == 'spectrum':
+            spectrum = get_cached_spectrum(audiofile, fps,
+                                           cache_dir=cache_dir, wr=wr)
+        else:
+            raise ValueError('unknown plot: %s' % plot)
+    finally:
+        wr.close()
 
     # Step 4: Define generation function
+    profiler = RenderProfiler()
+
+    def write_report(report: dict):
+        if report_file is not None:
+            with open(report_file, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+
     def callback(d: dict):
         if d['status'] not in ('after_write_frame', 'error'):
             return
@@ -83,68 +212,88 @@ def generate(
         if d['status'] != 'error' and d['current_frame_pos'] % 60 != 0:
             return
         # d['current_frame'].save('frames/%06d.png' % d['current_frame_pos'])
-        print(time.strftime('%Y-%m-%d %H:%M:%S', tup), d['current_frame_pos'])
+        if d['status'] == 'error':
+            print(time.strftime('%Y-%m-%d %H:%M:%S', tup),
+                  d['current_frame_pos'], d['err'])
+            return
+        eta = '--:--:--' if d['eta'] is None else \
+            time.strftime('%H:%M:%S', time.gmtime(d['eta']))
+        print(time.strftime('%Y-%m-%d %H:%M:%S', tup), d['current_frame_pos'],
+              '%.1f fps' % d['fps'], 'ETA', eta)
         # cv2.imwrite('frames/%06d.png' % d['current_frame_pos'],
         #             d['current_frame'])
 
     # Step 4.1: Fade in (default: background 6s, linear; anchor last 3s,
     # extend from center, linear)
-    mask = Image.new('RGBA', size, (0, 0, 0, 255))
+    # NOTE: The background is faded with integer math on a cached buffer, and
+    # the anchor line is written as a box.
+    fader = Fader(bg_orig)
 
-    def genfunc_fade_in(n: int) -> Image.Image:
-        frame = bg_orig.copy()
+    def _fade_in_state(n: int) -> Tuple[float, list]:
+        boxes = []
         fps3 = 3 * fps
         if n >= fps3:
             w = anchor_width * (n - fps3) / fps3
-            draw = ImageDraw.Draw(frame)
-            draw.rectangle(
-                (math.ceil((size[0] - w) / 2), anchor_up,
-                 math.ceil((size[0] + w) / 2), anchor_down),
-                (255, 255, 255, 255))
+            boxes.append(((math.ceil((size[0] - w) / 2), anchor_up,
+                           math.ceil((size[0] + w) / 2) + 1, anchor_down + 1),
+                          (255, 255, 255)))
+        return (n / fps / 6, boxes)
+
+    def genfunc_fade_in(n: int) -> Union[np.ndarray, object]:
+        with profiler.timer('fade_in'):
+            return _genfunc_fade_in(n)
+
+    def _genfunc_fade_in(n: int) -> Union[np.ndarray, object]:
+        opacity, boxes = _fade_in_state(n)
+        # NOTE: Consecutive frames with the same fixed-point opacity and the
+        # same anchor line are identical.
+        if n > 0:
+            last_opacity, last_boxes = _fade_in_state(n - 1)
+            if (Fader.level(opacity) == Fader.level(last_opacity) and
+                    boxes == last_boxes):
+                return REPEAT_FRAME
         
-        return Image.blend(mask, frame, n / fps / 6).convert('RGB')
+        return fader.render(opacity, boxes)
 
     # Step 4.2: Plots
     # NOTE: The "plots" can be many forms of visualization. In commit 46a06d6
     # the step name is "Wave" which is one of the available forms.
     layer_wave_height = wave_max_height * 2 + anchor_height
-    layer_wave = Image.new('RGBA', (anchor_width, layer_wave_height))
-    draw_layer_wave = ImageDraw.Draw(layer_wave)
-
-    def genfunc_wave(n: int) -> Image.Image:
-        frame = bg.copy()
-
-        # Step 4.2.1: Move wave
-        layer_wave.paste(layer_wave, (-speed, 0))
-
-        # Step 4.2.2: Erase useless part of wave
-        draw_layer_wave.rectangle(
-            (anchor_width - speed, 0, anchor_width, layer_wave_height),
-            (0, 0, 0, 0))
-
-        for i in range(speed):
-            # Step 4.2.3: Draw new part of wave
-            wr.setpos((n * speed + i) * math.floor(audio_frames_per_px))
-            str_data = wr.readframes(1) or b'\x00\x00\x00\x00'
-            w = np.frombuffer(str_data, dtype=np.int16)
-            w = abs(w * 1.0 / max_abs_w)  # shape: (2,)
-            draw_layer_wave.line((
-                anchor_width - speed + i,
-                math.floor(wave_max_height * (1 - w[0]) + 0.5),
-                anchor_width - speed + i,
-                anchor_height - 1 + int(wave_max_height * (1 + w[1]) + 0.5)
-            ), (255, 255, 255, 255))
-        
-        # Step 4.2.4: Apply all layers
-        frame.paste(layer_wave, (anchor_left, anchor_up - wave_max_height),
-                    layer_wave)
+    if plot == 'wave':
+        # NOTE: The upper wave is the first channel and the lower wave is the
+        # second one. See ``get_stereo_peaks()`` for other channel layouts.
+        wave_peaks = get_stereo_peaks(get_envelope_peaks(wave_envelope))
+        layer_plot = WaveLayer(wave_peaks, anchor_width, wave_max_height,
+                               anchor_height, speed, antialias=antialias)
+    else:
+        # NOTE: Bars of every frame are precomputed, so a frame of spectrum
+        # costs no more than a frame of wave.
+        layer_plot = SpectrumLayer(spectrum[:video_nframes], anchor_width,
+                                   wave_max_height, anchor_height)
+
+    # NOTE: Only boxes of layers are blended on the cached background, and
+    # the rest of the frame is never touched.
+    compositor = Compositor(bg)
+
+    def _layers_wave(n: int) -> list:
+        # Step 4.2.1: Render the plot at the n-th frame
+        with profiler.timer(plot):
+            return [(layer_plot.render(n),
+                     (anchor_left, anchor_up - wave_max_height))]
 
-        return frame.convert('RGB')
+    def _compose(layers: list) -> np.ndarray:
+        with profiler.timer('compose'):
+            return compositor.compose(layers)
+
+    def genfunc_wave(n: int) -> np.ndarray:
+        # Step 4.2.2: Apply all layers
+        return _compose(_layers_wave(n))
 
     # Step 4.3: Subtitles (default: 500ms fade-in and -out, size=72,
     # shadow=BoxBlur(7), shadow_color=(140, 140, 140, 255))
-    genfuncs: Dict[str,
-                   List[Tuple[int, int, Callable[[int], Image.Image]]]] = {}
+    # NOTE: Lines of every language are looked up from a timeline by frames,
+    # so subtitles can be rendered in any order and lines may overlap.
+    timelines: Dict[str, SubtitleTimeline] = {}
 
     def _get_frames(fps, line: SrtWithFadeLine):
         fade_in_secs = (line.end_fade_in - line.start_fade_in).total_seconds()
@@ -156,97 +305,94 @@ def generate(
         fade_out_frames = math.floor(fps * fade_out_secs + 0.5)
         return (fade_in_frames, line_frames, fade_out_frames)
 
+    # NOTE: Every line is rasterized only once, and fading is done by scaling
+    # all channels of the cached premultiplied sprite.
+    sprite_cache = SpriteCache()
+
+    def _render_subtitle(line: SrtWithFadeLine,
+                         font: ImageFont.FreeTypeFont) -> Image.Image:
+        """Render a subtitle line at full opacity."""
+
+        expand = max(1, round(10 * scale))
+        return render_text(line.content, (255, 255, 255, 255), font,
+                           shadow_fill=(140, 140, 140, 255),
+                           shadow_filter=ImageFilter.BoxBlur(7 * scale),
+                           size_expand=(expand,) * 4)
+
     def _genfunc_subtitle(n: int, fps, line: SrtWithFadeLine,
-                          font: ImageFont.FreeTypeFont) -> Image.Image:
+                          font: ImageFont.FreeTypeFont) -> np.ndarray:
         """A full view of a subtitle line, including all special effects."""
 
         fade_in_frames, line_frames, fade_out_frames = _get_frames(fps, line)
         t1 = fade_in_frames + line_frames
         t2 = t1 + fade_out_frames
 
-        def _multiline_check(text):
-            """See ``_multiline_check()`` source code in ``PIL.ImageDraw``."""
-            split_character = '\n' if isinstance(text, str) else b'\n'
-            return split_character in text
-
-        if _multiline_check(line.content):
-            size = font.getsize_multiline(line.content)
-        else:
-            size = font.getsize(line.content)
-        size = (size[0] + 20, size[1] + 20)  # expand a bit more
-
         # Step 4.3.1: Fade in
         if 0 <= n < fade_in_frames:
-            return fade_in(fade_in_frames, line.content, (255, 255, 255, 255),
-                           font, shadow_fill=(140, 140, 140, 255),
-                           shadow_filter=ImageFilter.BoxBlur(7),
-                           size_expand=(10, 10, 10, 10))(n)
+            alpha = math.floor(n / fade_in_frames * 255 + 0.5)
         # Step 4.3.2: Stable view
         elif fade_in_frames <= n < t1:
-            return fade_in(fade_in_frames, line.content, (255, 255, 255, 255),
-                           font, shadow_fill=(140, 140, 140, 255),
-                           shadow_filter=ImageFilter.BoxBlur(7),
-                           size_expand=(10, 10, 10, 10))(fade_in_frames)
+            alpha = 255
         # Step 4.3.3: Fade out
         elif t1 <= n < t2:
-            return fade_out(fade_out_frames, line.content,
-                            (255, 255, 255, 255), font,
-                            shadow_fill=(140, 140, 140, 255),
-                            shadow_filter=ImageFilter.BoxBlur(7),
-                            size_expand=(10, 10, 10, 10))(n - t1)
+            alpha = 255 - math.floor((n - t1) / fade_out_frames * 255 + 0.5)
+        else:
+            return None
+
+        key = (line.content, font.path, font.size, font.index)
+        return sprite_cache.get(key, partial(_render_subtitle, line, font),
+                                alpha)
 
     # Step 4.3.4: Mix with plots
     for lang, lrcfile in lrcfiles.items():
         if lang not in AVAILABLE_LRC_LANGS:
             raise ValueError('invalid subtitle language: %s' % lang)
-        genfuncs[lang] = []
+        intervals: List[Tuple[int, int, Callable[[int], np.ndarray]]] = []
         with open(lrcfile, 'r', encoding='utf-8') as f:
             lrc_string = f.read()
         srt_string = parse_lrc_to_srt(lrc_string)
         fade_lines = parse_srt_with_fade(srt_string, 0.5, 0.5)
+        font_name, font_size = DEFAULT_FONTS[lang]
+        font = load_font(font_name, max(1, round(font_size * scale)),
+                         search_path=font_path)
 
         for line in fade_lines:
             start_frame = int(fps * line.start_fade_in.total_seconds())
             t1, t2, t3 = _get_frames(fps, line)
-            genfuncs[lang].append((
+            intervals.append((
                 start_frame,
                 start_frame + t1 + t2 + t3,
                 partial(_genfunc_subtitle, fps=fps, line=line,
-                        font=DEFAULT_FONTS[lang])
+                        font=font)
             ))
+        timelines[lang] = SubtitleTimeline(intervals)
     
     line_xy = {
         'ja': (size[0] // 2, (size[1] - layer_wave_height) // 4),
         'zh': (size[0] // 2, (3 * size[1] + layer_wave_height) // 4)
     }
 
-    avail_langs = list(genfuncs.keys())
-    line_ptrs = {k: 0 for k in avail_langs}
-
-    if genfuncs:
-        def genfunc_wave_with_subtitles(n: int) -> Image.Image:
-            # Step 4.3.4.1: Generate wave layer
-            img = genfunc_wave(n).convert('RGBA')
-
-            # Step 4.3.4.2: Walk through subtitle lines by languages and apply
-            # NOTE: assume that there is at least one subtitle
-            for lang in avail_langs:
-                lptr = line_ptrs[lang]
-                if lptr >= len(genfuncs[lang]):
-                    continue
-                start_frame, end_frame, genfunc = genfuncs[lang][lptr]
-                # This line should be applied.
-                if start_frame <= n < end_frame:
+    if timelines:
+        def _layers_subtitles(n: int, layers: list):
+            for lang, timeline in timelines.items():
+                # Apply all active lines
+                for start_frame, genfunc in timeline.active(n):
                     img_line = genfunc(n - start_frame)
                     # left-top corner xy
-                    lt_xy = (line_xy[lang][0] - img_line.size[0] // 2,
-                             line_xy[lang][1] - img_line.size[1] // 2)
-                    img.alpha_composite(img_line, lt_xy)
-                # This line should be expired.
-                elif n >= end_frame:
-                    line_ptrs[lang] += 1
-
-            return img.convert('RGB')
+                    lt_xy = (line_xy[lang][0] - img_line.shape[1] // 2,
+                             line_xy[lang][1] - img_line.shape[0] // 2)
+                    layers.append((img_line, lt_xy, True))
+
+        def genfunc_wave_with_subtitles(n: int) -> np.ndarray:
+            # Step 4.3.4.1: Generate wave layer
+            layers = _layers_wave(n)
+
+            # Step 4.3.4.2: Look up active subtitle lines by languages and
+            # apply
+            with profiler.timer('subtitle'):
+                _layers_subtitles(n, layers)
+
+            return _compose(layers)
         
     # Step 4.3.5: fallback to the original `genfunc_wave` without subtitles
     else:
@@ -255,28 +401,21 @@ def generate(
     # Step 4.4: Silence (default: await the whole wave fading out)
     silence_nframes = math.ceil(anchor_width / speed)
 
-    def genfunc_still(n: int) -> Image.Image:
-        frame = bg.copy()
-
-        # Step 4.4.1: Move wave
-        layer_wave.paste(layer_wave, (-speed, 0))
-
-        # Step 4.4.2: Erase useless part of wave
-        draw_layer_wave.rectangle(
-            (anchor_width - speed, 0, anchor_width, layer_wave_height),
-            (0, 0, 0, 0))
-
-        # Step 4.4.3: Apply all layers
-        frame.paste(layer_wave, (anchor_left, anchor_up - wave_max_height),
-                    layer_wave)
-
-        return frame.convert('RGB')
+    def genfunc_still(n: int) -> Union[np.ndarray, object]:
+        # NOTE: The wave keeps moving without any new columns, and frames
+        # are identical after it scrolls out (or bars of spectrum end).
+        if n > 0 and video_nframes + n - 1 >= layer_plot.still_from:
+            return REPEAT_FRAME
+        with profiler.timer('still'):
+            return genfunc_wave(video_nframes + n)
 
     # Step 5: Concat all generation functions
-    video_nframes = math.ceil(nframes / framerate * fps)
     fps6 = 6 * fps
 
-    def genfunc(n: int) -> Image.Image:
+    # NOTE: Every frame only depends on ``n``, since caches (e.g. the
+    # compositor) give the same results in any order.
+    @order_independent
+    def genfunc(n: int) -> Union[Image.Image, np.ndarray]:
         if n < fps6:
             return genfunc_fade_in(n)
         elif n < fps6 + video_nframes:
@@ -285,6 +424,190 @@ def generate(
             return genfunc_still(n - fps6 - video_nframes)
 
     # Step 6: Launch video conductor
-    vc = VideoConductor(outfile, size, fps, genfunc, vcodec, bv, audiofile,
-                        acodec, filter_complex)
-    vc.conduct(video_nframes + fps6 + silence_nframes, stdout, stderr, callback)
+    total_nframes = video_nframes + fps6 + silence_nframes
+    results = {}
+
+    def tracking_callback(d: dict):
+        callback(d)
+        if d['status'] == 'error':
+            results['error'] = d['err']
+        elif d['status'] == 'finish':
+            results['returncode'] = d['ffmpeg_process'].returncode
+            results['report'] = d['report']
+
+    def succeeded() -> bool:
+        return 'error' not in results and results.get('returncode') == 0
+
+    if segment_dir is None:
+        first, last = 0, total_nframes
+        if window is not None:
+            first = min(max(math.floor(window[0] * fps), 0), total_nframes)
+            last = max(min(math.ceil(window[1] * fps), total_nframes), first)
+        vc = VideoConductor(outfile, size, fps, genfunc, vcodec, bv, audiofile,
+                            acodec, filter_complex, workers=workers,
+                            profiler=profiler, threads=threads, preset=preset)
+        vc.conduct(last - first, stdout, stderr, tracking_callback, first)
+        if 'report' in results:
+            write_report(results['report'])
+        return succeeded()
+
+    # Step 6.1: Render segments without audio
+    # NOTE: Any change of inputs or parameters makes done segments stale.
+    key = {
+        'size': list(size), 'fps': fps, 'vcodec': vcodec, 'bv': bv,
+        'speed': speed, 'plot': plot, 'antialias': antialias,
+        'preset': preset,
+        'audiofile': get_file_key(audiofile),
+        'backgroundfile': get_file_key(backgroundfile),
+        'background_fit': background_fit,
+        'lrcfiles': {k: get_file_key(v) for k, v in lrcfiles.items()}
+    }
+    manifest = SegmentManifest.open(segment_dir, total_nframes,
+                                    segment_frames, key,
+                                    pathlib.Path(outfile).suffix or '.mp4')
+    ok = True
+    reports = {}
+    if segments is None:
+        segments = range(len(manifest.segments))
+    for idx in segments:
+        if manifest.is_done(idx):
+            continue
+        start, end = manifest.segments[idx]
+        results.clear()
+        vc = VideoConductor(manifest.path(idx), size, fps, genfunc, vcodec,
+                            bv, workers=workers, profiler=profiler,
+                            threads=threads, preset=preset)
+        vc.conduct(end - start, stdout, stderr, tracking_callback, start)
+        if 'report' in results:
+            reports[idx] = results['report']
+        if succeeded():
+            manifest.mark_done(idx)
+        else:
+            ok = False
+    # NOTE: Every segment has its own profiling, so reports of segments
+    # rendered by this call are merged into one.
+    if reports:
+        write_report(merge_reports(reports))
+
+    # Step 6.2: Concat segments and mux audio
+    if not concat:
+        return ok
+    if manifest.pending():
+        return False
+    return concat_segments(manifest, outfile, audiofile, acodec,
+                           filter_complex, stdout, stderr) == 0
+
+
+def preview(
+    outfile: Union[str, pathlib.Path],
+    size: Tuple[int, int],
+    fps: int,
+    vcodec: str,
+    bv: int,
+    speed: int,
+    audiofile: Union[str, pathlib.Path],
+    acodec: Union[str, None],
+    filter_complex: Union[str, None],
+    backgroundfile: Union[str, pathlib.Path],
+    lrcfiles: Dict[str, Union[str, pathlib.Path]],
+    stdout: Union[int, IOBase, None],
+    stderr: Union[int, IOBase, None],
+    window: Union[Tuple[float, float], None] = None,
+    scale: float = PREVIEW_SCALE,
+    max_fps: int = PREVIEW_FPS,
+    **kwargs
+) -> bool:
+    """A function to generate a draft of the final creation quickly, e.g. to
+    check timings and layout of subtitles.
+
+    Parameters are the same as ``generate()``, which are of the full-size
+    video. The draft is scaled by ``scale``, rendered at no more than
+    ``max_fps`` frames per second with the wave moving at the same pace, and
+    encoded with the "ultrafast" preset at a proportionally lower bitrate.
+
+    :param window: a tuple (start, end) of seconds of the video to render
+    (default: None)
+
+    :param scale: the scale of the draft (default: 1/3)
+
+    :param max_fps: the maximum frames per second of the draft (default: 20)
+    """
+
+    preview_fps = min(fps, max_fps)
+    if bv is not None:
+        bv = max(1, round(bv * scale * scale * preview_fps / fps))
+    return generate(outfile, size, preview_fps, vcodec, bv,
+                    speed * fps / preview_fps, audiofile, acodec,
+                    filter_complex, backgroundfile, lrcfiles, stdout, stderr,
+                    scale=scale, preset=PREVIEW_PRESET, window=window,
+                    **kwargs)
+
+
+@lru_cache(maxsize=8)
+def _load_background(
+    path: str,
+    mtime_ns: int,
+    size: Union[Tuple[int, int], None],
+    fit: str
+) -> Image.Image:
+    with Image.open(path) as img:
+        if size is None or img.size == size:
+            return img.convert('RGBA')
+        # NOTE: JPEG images are decoded at a reduced scale if it is still
+        # larger than ``size``, which is much faster for huge artworks.
+        img.draft('RGB', size)
+        # NOTE: The image is converted after resampling if possible, which
+        # touches far fewer pixels.
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA')
+        else:
+            img.load()
+
+    width, height = img.size
+    if fit == 'stretch':
+        return img.resize(size, Image.LANCZOS,
+                          reducing_gap=3.0).convert('RGBA')
+    if fit == 'cover':
+        # scale to cover the frame, and crop the center
+        ratio = max(size[0] / width, size[1] / height)
+        box_w, box_h = size[0] / ratio, size[1] / ratio
+        box = ((width - box_w) / 2, (height - box_h) / 2,
+               (width + box_w) / 2, (height + box_h) / 2)
+        return img.resize(size, Image.LANCZOS, box,
+                          reducing_gap=3.0).convert('RGBA')
+    # scale to fit in the frame, and pad with black
+    ratio = min(size[0] / width, size[1] / height)
+    inner = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+    out = Image.new('RGBA', size, (0, 0, 0, 255))
+    out.paste(img.resize(inner, Image.LANCZOS,
+                         reducing_gap=3.0).convert('RGBA'),
+              ((size[0] - inner[0]) // 2, (size[1] - inner[1]) // 2))
+    return out
+
+
+def load_background(
+    path: Union[str, pathlib.Path],
+    size: Union[Tuple[int, int], None] = None,
+    fit: str = 'cover'
+) -> Image.Image:
+    """Load a background image with mode RGBA, which is cached and shared by
+    jobs in the same process until the file is modified.
+
+    :param size: Size tuple the image is resampled to. Use ``None`` to keep
+    the size of the image. (default: None)
+
+    :param fit: How the image fits in ``size`` if their aspect ratios are
+    different, "cover" to scale it to cover the whole frame and crop the
+    center, "contain" to scale it to fit in the frame and pad with black, or
+    "stretch" to scale it to ``size`` regardless of the aspect ratio.
+    (default: "cover")
+
+    NOTE: The returned object is shared, so never modify it in place.
+    """
+
+    if fit not in AVAILABLE_BACKGROUND_FITS:
+        raise ValueError('invalid background fit: %s' % fit)
+    if size is not None:
+        size = tuple(size)
+    path = pathlib.Path(path).resolve()
+    return _load_background(str(path), path.stat().st_mtime_ns, size, fit)
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+
+"""A module for plots of audio visualization."""
+
+
+import math
+from typing import Tuple
+
+import numpy as np
+
+
+# Type aliases
+_RGBA = Tuple[int, int, int, int]
+
+
+class WaveLayer:
+    """A class for a scrolling wave layer which can be rendered at any frame.
+
+    The wave scrolls from right to left by ``speed`` columns every frame, and
+    the newest columns always appear at the right edge of the layer. Since
+    the heights of all columns are precomputed, the ``n``-th frame is only a
+    window of ``width`` columns ending before column ``(n + 1) * speed``
+    (rounded down), and no frame depends on the previous ones.
+
+    Columns are rasterised at once by comparing row indices with the tops and
+    bottoms of all visible columns, so a frame costs a few array operations
+    whatever ``speed`` and ``width`` are.
+    """
+
+    def __init__(
+        self,
+        amplitudes: np.ndarray,
+        width: int,
+        max_height: int,
+        anchor_height: int,
+        speed: float,
+        fill: _RGBA = (255, 255, 255, 255),
+        antialias: bool = False
+    ):
+        """A wave layer object.
+
+        :param amplitudes: a ``numpy.ndarray`` with shape (ncolumns, 2) of
+        normalized amplitudes (from 0 to 1) of every pixel column
+        NOTE: The first amplitude extends upwards from the anchor line and the
+        second one extends downwards.
+
+        :param width: width of the layer
+
+        :param max_height: the maximum height of wave above or below the
+        anchor line
+
+        :param anchor_height: height of the anchor line
+
+        :param speed: the number of columns the wave moves every frame
+        NOTE: It may be fractional, e.g. in a scaled video, and the wave
+        moves by whole columns on average at the exact speed.
+
+        :param fill: color of the wave
+
+        :param antialias: Whether to blend the top and bottom pixels of every
+        column by their coverage. If False, columns are the same as vertical
+        lines drawn by ``ImageDraw``. (default: False)
+        """
+
+        self._width = width
+        self._max_height = max_height
+        self._anchor_height = anchor_height
+        self._speed = speed
+        self._antialias = antialias
+        self._ncolumns = amplitudes.shape[0]
+        self._size = (width, max_height * 2 + anchor_height)
+        height = self._size[1]
+        # NOTE: A pixel is packed as one uint32, so a whole frame is written
+        # by one multiplication of a mask.
+        fill = np.array(fill, dtype=np.uint8)
+        self._fill = fill.view(np.uint32)[0]
+        self._fill_rgb = np.array((*fill[:3], 0), np.uint8).view(np.uint32)[0]
+        self._fill_alpha = int(fill[3])
+        # NOTE: Columns are padded by ``width`` empty columns on both sides,
+        # so every frame is a slice of ``width`` columns.
+        pad = (width, width)
+        if antialias:
+            # exact edges of columns, where bottoms are exclusive
+            self._tops = np.pad(
+                (max_height * (1 - amplitudes[:, 0])).astype(np.float32),
+                pad, constant_values=height)
+            self._bottoms = np.pad(
+                (anchor_height +
+                 max_height * (1 + amplitudes[:, 1])).astype(np.float32),
+                pad, constant_values=0)
+            self._rows = np.arange(height, dtype=np.float32)[:, np.newaxis]
+        else:
+            # pixel rows of columns, the same as vertical lines drawn by
+            # ``ImageDraw``
+            tops = np.floor(
+                max_height * (1 - amplitudes[:, 0]) + 0.5).astype(np.int32)
+            bottoms = (
+                anchor_height - 1 +
+                (max_height * (1 + amplitudes[:, 1]) + 0.5).astype(np.int32))
+            # NOTE: ``top <= y <= bottom`` is ``y - top <= bottom - top`` in
+            # unsigned integers, which takes one comparison.
+            self._tops = np.pad(tops, pad, constant_values=height)
+            self._lengths = np.pad(bottoms - tops, pad).astype(np.uint32)
+            self._rows = np.arange(height, dtype=np.int32)[:, np.newaxis]
+
+    def columns(self, n: int) -> Tuple[int, int]:
+        """Get the range of columns shown in the ``n``-th frame.
+
+        :returns: a tuple (first column, last column + 1), where the first
+        column is shown at the left edge of the layer and may be negative
+        """
+
+        end = math.floor((n + 1) * self._speed)
+        return (end - self._width, end)
+
+    def render(self, n: int) -> np.ndarray:
+        """Render the ``n``-th frame of the layer.
+
+        :returns: an HxWx4 array of uint8 with background color (0, 0, 0, 0)
+        """
+
+        width, height = self._size
+        start, end = self.columns(n)
+        if start >= self._ncolumns or end <= 0:
+            return np.zeros((height, width, 4), dtype=np.uint8)
+        window = slice(start + width, end + width)
+        if not self._antialias:
+            mask = ((self._rows - self._tops[window]).view(np.uint32) <=
+                    self._lengths[window])
+            out = np.multiply(mask, self._fill, dtype=np.uint32)
+            return out.view(np.uint8).reshape(height, width, 4)
+
+        # NOTE: The coverage of a pixel is the overlap of its row
+        # [y, y + 1) and the column [top, bottom).
+        coverage = np.minimum(self._rows + 1, self._bottoms[window])
+        coverage -= np.maximum(self._rows, self._tops[window])
+        np.clip(coverage, 0, 1, out=coverage)
+        out = np.multiply(coverage > 0, self._fill_rgb, dtype=np.uint32)
+        out = out.view(np.uint8).reshape(height, width, 4)
+        out[..., 3] = coverage * self._fill_alpha + 0.5
+        return out
+
+    @property
+    def size(self) -> Tuple[int, int]: return self._size
+
+    @property
+    def ncolumns(self) -> int: return self._ncolumns
+
+    @property
+    def antialias(self) -> bool: return self._antialias
+
+    @property
+    def still_from(self) -> int:
+        """The first frame from which all frames are identical, i.e. the
+        wave has scrolled out.
+        """
+
+        return math.ceil((self._ncolumns + self._width) / self._speed) - 1
+
+
+class SpectrumLayer:
+    """A class for a layer of spectrum bars which can be rendered at any
+    frame.
+
+    Heights of bars of all frames are precomputed (e.g. by
+    ``get_spectrum()``), so the ``n``-th frame is only a comparison of row
+    indices with heights of columns, without any FFT.
+    """
+
+    def __init__(
+        self,
+        spectrum: np.ndarray,
+        width: int,
+        max_height: int,
+        anchor_height: int,
+        gap: int = 2,
+        fill: _RGBA = (255, 255, 255, 255)
+    ):
+        """A spectrum layer object.
+
+        :param spectrum: a ``numpy.ndarray`` with shape (nframes, nbins) of
+        normalized heights (from 0 to 1) of bars of every frame
+        NOTE: Frames after the last one have no bars.
+
+        :param width: width of the layer, which is split into ``nbins`` bars
+        from low to high frequencies
+
+        :param max_height: the maximum height of bars above or below the
+        anchor line
+        NOTE: Bars extend upwards from the anchor line and are mirrored
+        downwards, the same as the wave layer.
+
+        :param anchor_height: height of the anchor line
+
+        :param gap: the number of columns between bars (default: 2)
+
+        :param fill: color of bars
+        """
+
+        nframes, nbins = spectrum.shape
+        self._nframes = nframes
+        self._max_height = max_height
+        self._anchor_height = anchor_height
+        self._size = (width, max_height * 2 + anchor_height)
+        self._heights = np.floor(
+            np.asarray(spectrum, dtype=np.float32) * max_height + 0.5
+        ).astype(np.int32)
+        # the bar of every column, or -1 for gaps
+        pitch = width / nbins
+        x = np.arange(width)
+        col_bins = np.minimum((x / pitch).astype(np.int64), nbins - 1)
+        col_bins[x - np.floor(col_bins * pitch) >= pitch - gap] = -1
+        self._col_bins = col_bins
+        # distance of every row from the anchor line, and -1 on it
+        y = np.arange(self._size[1])
+        self._row_dists = np.where(
+            y < max_height, max_height - 1 - y,
+            np.where(y >= max_height + anchor_height,
+                     y - max_height - anchor_height, -1))
+        self._fill = np.array(fill, dtype=np.uint8)
+
+    def render(self, n: int) -> np.ndarray:
+        """Render the ``n``-th frame of the layer.
+
+        :returns: an HxWx4 array of uint8 with background color (0, 0, 0, 0)
+        """
+
+        out = np.zeros((self._size[1], self._size[0], 4), dtype=np.uint8)
+        if not 0 <= n < self._nframes:
+            return out
+        col_heights = np.where(self._col_bins >= 0,
+                               self._heights[n][self._col_bins], 0)
+        mask = self._row_dists[:, np.newaxis] < col_heights
+        mask &= self._row_dists[:, np.newaxis] >= 0
+        out[mask] = self._fill
+        return out
+
+    @property
+    def size(self) -> Tuple[int, int]: return self._size
+
+    @property
+    def nframes(self) -> int: return self._nframes
+
+    @property
+    def still_from(self) -> int:
+        """The first frame from which all frames are identical, i.e. there is
+        no bar.
+        """
+
+        return self._nframes
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+"""A module for profiling of rendering frames."""
+
+
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Generator, List, Union
+
+import numpy as np
+
+
+# Percentiles in reports
+REPORT_PERCENTILES = (50, 90, 99)
+
+
+class RenderProfiler:
+    """A class for collecting timings of rendering frames.
+
+    Timings are accumulated by names (e.g. "genfunc", "encode" or a stage of
+    a generation function) until the frame ends, and then recorded as timings
+    of the frame. The total time of every frame is recorded as "frame".
+    """
+
+    def __init__(self, window: int = 60):
+        """A render profiler object.
+
+        :param window: the number of recent frames used to compute the
+        rolling frames per second (default: 60)
+        """
+
+        self.window = window
+        self.reset()
+
+    def reset(self, nframes: int = -1):
+        """Drop all timings and start profiling.
+
+        :param nframes: The number of frames to be rendered, which is used to
+        compute ETA. -1 if unknown. (default: -1)
+        """
+
+        self.nframes = nframes
+        self._timings: Dict[str, List[float]] = {}
+        self._pending: Dict[str, float] = {}
+        self._nframes_done = 0
+        self._nframes_repeated = 0
+        self._start = self._last = time.perf_counter()
+        self._end = None
+        self._stamps = deque([self._start], maxlen=self.window + 1)
+
+    def add(self, name: str, seconds: float):
+        """Add time to a timing of the current frame."""
+
+        self._pending[name] = self._pending.get(name, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, name: str) -> Generator:
+        """A context manager adding the time it takes to a timing of the
+        current frame.
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def end_frame(self, repeated: bool = False) -> Dict[str, float]:
+        """End the current frame.
+
+        :param repeated: whether the frame repeats the previous one
+
+        :returns: a dict of timings (unit: second) of the frame
+        """
+
+        now = time.perf_counter()
+        timings = self._pending
+        self._pending = {}
+        timings['frame'] = now - self._last
+        self._last = now
+        for name, seconds in timings.items():
+            self._timings.setdefault(name, []).append(seconds)
+        self._nframes_done += 1
+        self._nframes_repeated += repeated
+        self._stamps.append(now)
+        return timings
+
+    def finish(self):
+        """Stop profiling."""
+
+        self._end = time.perf_counter()
+
+    @property
+    def fps(self) -> float:
+        """Rolling frames per second of recent frames."""
+
+        elapsed = self._stamps[-1] - self._stamps[0]
+        if elapsed <= 0:
+            return 0.0
+        return (len(self._stamps) - 1) / elapsed
+
+    @property
+    def eta(self) -> Union[float, None]:
+        """Estimated seconds until all frames are rendered, or ``None`` if
+        unknown.
+        """
+
+        fps = self.fps
+        if self.nframes < 0 or fps <= 0:
+            return None
+        return max(self.nframes - self._nframes_done, 0) / fps
+
+    def report(self) -> Dict[str, Any]:
+        """Get a report of all frames.
+
+        :returns: a JSON-serializable dict, where every timing has its count,
+        total, mean, maximum and percentiles (unit: second)
+        NOTE: A timing is only counted in frames it appears in, e.g. stages of
+        a generation function.
+        """
+
+        end = self._end if self._end is not None else time.perf_counter()
+        elapsed = end - self._start
+        timings = {}
+        for name, values in self._timings.items():
+            arr = np.array(values)
+            d = {
+                'count': len(values),
+                'total': float(arr.sum()),
+                'mean': float(arr.mean()),
+                'max': float(arr.max())
+            }
+            for q, v in zip(REPORT_PERCENTILES,
+                            np.percentile(arr, REPORT_PERCENTILES)):
+                d['p%d' % q] = float(v)
+            timings[name] = d
+        return {
+            'nframes': self._nframes_done,
+            'repeated_frames': self._nframes_repeated,
+            'elapsed': elapsed,
+            'fps': self._nframes_done / elapsed if elapsed > 0 else 0.0,
+            'timings': timings
+        }
+
+    def dump(self, fp, **kwargs):
+        """Write the report as JSON to a file object.
+
+        See documentation of ``json.dump()`` for other parameters.
+        """
+
+        json.dump(self.report(), fp, **kwargs)
+
+
+def merge_reports(reports: Dict[Any, Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge reports of separate renders, e.g. segments of a video.
+
+    :param reports: a dict of reports from ``RenderProfiler.report()`` keyed
+    by JSON-serializable names (e.g. indices of segments)
+
+    :returns: a JSON-serializable dict of frames, elapsed time and timings of
+    all renders, with the original reports under "parts" by their names
+    NOTE: Percentiles can't be merged, so merged timings only have their
+    count, total, mean and maximum. Elapsed time is the sum of all renders.
+    """
+
+    nframes = sum(r['nframes'] for r in reports.values())
+    elapsed = sum(r['elapsed'] for r in reports.values())
+    timings = {}
+    for r in reports.values():
+        for name, t in r['timings'].items():
+            d = timings.setdefault(name, {'count': 0, 'total': 0.0,
+                                          'max': 0.0})
+            d['count'] += t['count']
+            d['total'] += t['total']
+            d['max'] = max(d['max'], t['max'])
+    for d in timings.values():
+        d['mean'] = d['total'] / d['count'] if d['count'] > 0 else 0.0
+    return {
+        'nframes': nframes,
+        'repeated_frames': sum(r['repeated_frames'] for r in reports.values()),
+        'elapsed': elapsed,
+        'fps': nframes / elapsed if elapsed > 0 else 0.0,
+        'timings': timings,
+        'parts': {str(k): r for k, r in reports.items()}
+    }
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+"""A module for chunked rendering of videos into segments."""
+
+
+import hashlib
+import json
+import os
+import pathlib
+import subprocess
+from io import IOBase
+from typing import Any, Dict, List, Tuple, Union
+
+
+# Version of the format of manifests
+MANIFEST_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+CONCAT_LIST_NAME = 'concat.txt'
+# Suffix of a marker file written after a segment is done
+DONE_SUFFIX = '.done'
+
+
+class SegmentManifest:
+    """A class for a manifest of segments of a video.
+
+    The frames of a video are split into segments of ``segment_frames``
+    frames, and every segment is rendered into its own file. A segment is
+    done only if its marker file exists with the digest of the manifest, so
+    that segments can be rendered by several processes sharing the directory,
+    and a restarted job skips segments already done. A manifest is replaced
+    if its key (e.g. parameters of rendering) changes.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, pathlib.Path],
+        nframes: int,
+        segment_frames: int,
+        key: Dict[str, Any],
+        suffix: str = '.mp4'
+    ):
+        """A segment manifest object.
+
+        :param directory: the directory of the manifest and segment files
+
+        :param nframes: the number of all frames of the video
+
+        :param segment_frames: the number of frames of every segment
+
+        :param key: a JSON-serializable dict identifying the video
+        NOTE: Any change of it makes all done segments stale.
+
+        :param suffix: suffix of segment files (default: ".mp4")
+        """
+
+        if segment_frames <= 0:
+            raise ValueError('segment_frames should be positive')
+
+        self.directory = pathlib.Path(directory)
+        self.nframes = nframes
+        self.segment_frames = segment_frames
+        self.key = key
+        self.suffix = suffix
+        self.digest = hashlib.blake2b(json.dumps({
+            'version': MANIFEST_VERSION,
+            'key': key,
+            'nframes': nframes,
+            'segment_frames': segment_frames,
+            'suffix': suffix
+        }, sort_keys=True).encode(), digest_size=16).hexdigest()
+        self.segments: List[Tuple[int, int]] = [
+            (start, min(start + segment_frames, nframes))
+            for start in range(0, nframes, segment_frames)]
+
+    @classmethod
+    def open(
+        cls,
+        directory: Union[str, pathlib.Path],
+        nframes: int,
+        segment_frames: int,
+        key: Dict[str, Any],
+        suffix: str = '.mp4'
+    ) -> 'SegmentManifest':
+        """Create a manifest in a directory and write the manifest file.
+
+        NOTE: Segments done by a previous manifest with the same digest are
+        still done, while others are stale and rendered again.
+
+        See ``SegmentManifest.__init__()`` for parameters.
+        """
+
+        manifest = cls(directory, nframes, segment_frames, key, suffix)
+        manifest.directory.mkdir(parents=True, exist_ok=True)
+        manifest.save()
+        return manifest
+
+    def path(self, idx: int) -> pathlib.Path:
+        """Get the path of the ``idx``-th segment file."""
+
+        return self.directory / ('segment_%05d%s' % (idx, self.suffix))
+
+    def _marker_path(self, idx: int) -> pathlib.Path:
+        return self.directory / ('segment_%05d%s' % (idx, DONE_SUFFIX))
+
+    def is_done(self, idx: int) -> bool:
+        """Check if the ``idx``-th segment has been done."""
+
+        try:
+            with open(self._marker_path(idx), 'r', encoding='utf-8') as f:
+                return f.read().strip() == self.digest and \
+                    self.path(idx).exists()
+        except OSError:
+            return False
+
+    def mark_done(self, idx: int):
+        """Mark the ``idx``-th segment as done."""
+
+        write_atomic(self._marker_path(idx), self.digest)
+        self.save()
+
+    def pending(self) -> List[int]:
+        """Get indices of segments not done yet."""
+
+        return [idx for idx in range(len(self.segments))
+                if not self.is_done(idx)]
+
+    def save(self):
+        """Write the manifest file.
+
+        NOTE: ``done`` in the file is only informational, since marker files
+        decide whether segments are done.
+        """
+
+        write_atomic(self.directory / MANIFEST_NAME, json.dumps({
+            'version': MANIFEST_VERSION,
+            'digest': self.digest,
+            'key': self.key,
+            'nframes': self.nframes,
+            'segment_frames': self.segment_frames,
+            'segments': [{
+                'start': start,
+                'end': end,
+                'file': self.path(idx).name,
+                'done': self.is_done(idx)
+            } for idx, (start, end) in enumerate(self.segments)]
+        }, indent=2))
+
+
+def write_atomic(path: pathlib.Path, data: Union[str, bytes]):
+    """Write a string or bytes to a file through a temporary file, so that a
+    broken file is never left if interrupted.
+
+    NOTE: The temporary file is unique to the process, so processes sharing
+    a directory (e.g. jobs sharing a cache directory) never write the same
+    temporary file.
+    """
+
+    tmp_path = path.with_name('%s.%d.tmp' % (path.name, os.getpid()))
+    try:
+        if isinstance(data, bytes):
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+        else:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def concat_args(
+    list_file: Union[str, pathlib.Path],
+    outfile: Union[str, pathlib.Path],
+    audiofile: Union[str, pathlib.Path, None] = None,
+    acodec: Union[str, None] = None,
+    filter_complex: Union[str, None] = None
+) -> List[str]:
+    """Get FFmpeg args of concatenating segments without re-encoding video.
+
+    NOTE: The concatenated video is the input 0 and the audio file is the
+    input 1, which are the same as in ``VideoConductor``, so the same
+    ``filter_complex`` applies.
+    """
+
+    args = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', str(list_file)]
+    if audiofile is not None:
+        args.extend(['-i', str(audiofile)])
+    args.extend(['-vcodec', 'copy'])
+    if acodec is not None:
+        args.extend(['-acodec', acodec])
+    if filter_complex is not None:
+        args.extend(['-filter_complex', filter_complex])
+    args.append(str(outfile))
+    return args
+
+
+def concat_segments(
+    manifest: SegmentManifest,
+    outfile: Union[str, pathlib.Path],
+    audiofile: Union[str, pathlib.Path, None] = None,
+    acodec: Union[str, None] = None,
+    filter_complex: Union[str, None] = None,
+    stdout: Union[int, IOBase, None] = None,
+    stderr: Union[int, IOBase, None] = None
+) -> int:
+    """Concatenate all segments with the FFmpeg concat demuxer, and mux the
+    audio once.
+
+    :param manifest: a manifest whose segments are all done
+
+    :returns: the return code of FFmpeg
+    """
+
+    if manifest.pending():
+        raise ValueError('some segments are not done')
+
+    list_file = manifest.directory / CONCAT_LIST_NAME
+    lines = []
+    for idx in range(len(manifest.segments)):
+        path = str(manifest.path(idx).resolve()).replace("'", "'\\''")
+        lines.append("file '%s'" % path)
+    write_atomic(list_file, '\n'.join(lines) + '\n')
+    return subprocess.run(
+        concat_args(list_file, outfile, audiofile, acodec, filter_complex),
+        stdout=stdout, stderr=stderr).returncode
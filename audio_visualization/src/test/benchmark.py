@@ -0,0 +1,506 @@
+# -*- coding: utf-8 -*-
+
+"""A module for benchmarks of the rendering pipeline.
+
+All inputs (WAV, LRC and background files) are synthesized, and frames are
+written to a null sink instead of FFmpeg by default, so benchmarks run
+offline. Every component is run in a fresh process to measure its peak RSS.
+Results are written as JSON, which can be compared with a previous run.
+Subtitles are rendered with ``BENCHMARK_FONT`` whatever fonts are installed,
+and the process exits with status 1 if any component fails.
+
+Usage (in the directory ``audio_visualization``)::
+
+    python -m src.test.benchmark -o bench.json
+    python -m src.test.benchmark -o bench2.json --compare bench.json
+"""
+
+
+import argparse
+import json
+import math
+import multiprocessing as mp
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Generator, List, Tuple, Union
+
+import numpy as np
+import PIL
+from PIL import Image, ImageFilter, ImageFont
+
+try:
+    import resource
+except ImportError:
+    # NOTE: The module is unavailable on Windows, where peak RSS is unknown.
+    resource = None
+
+from .. import generate_video
+from ..compositor import Compositor
+from ..audio_visualization import get_wave_dots, get_wave_envelope, open_audio
+from ..profiling import RenderProfiler
+from ..text_effects import fade_in
+from ..video_conductor import VideoConductor
+
+
+# Version of the format of results
+BENCHMARK_VERSION = 1
+# Root directory of the project
+ROOT_DIR = pathlib.Path(__file__).resolve().parents[2]
+BENCHMARK_FONT = ROOT_DIR / 'fonts' / 'DFSHAONVW5.TTC'
+# A script reading and dropping all data from stdin, used as the null sink
+NULL_SINK_SCRIPT = ('import sys\n'
+                    'while sys.stdin.buffer.read(1048576):\n'
+                    '    pass\n')
+AVAILABLE_SINKS = ('null', 'ffmpeg')
+
+
+##############
+# Synthesizer
+##############
+
+def synth_wav(
+    path: Union[str, pathlib.Path],
+    seconds: float = 10.0,
+    framerate: int = 44100,
+    nchannels: int = 2,
+    seed: int = 0
+):
+    """Synthesize a 16-bit WAV file of tones with a slow envelope and noise.
+
+    :param path: path of the WAV file
+
+    :param seconds: duration of the track (default: 10.0)
+
+    :param framerate: sample rate (default: 44100)
+
+    :param nchannels: the number of channels (default: 2)
+
+    :param seed: seed of the noise (default: 0)
+    """
+
+    rng = np.random.default_rng(seed)
+    nframes = int(seconds * framerate)
+    freqs = 220.0 * np.arange(1, nchannels + 1)
+    with wave.open(str(path), 'wb') as ww:
+        ww.setnchannels(nchannels)
+        ww.setsampwidth(2)
+        ww.setframerate(framerate)
+        # NOTE: Write 10 seconds at a time to bound memory of long tracks.
+        for start in range(0, nframes, framerate * 10):
+            t = np.arange(start, min(start + framerate * 10, nframes)) / \
+                framerate
+            envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 0.5 * t)
+            w = 0.6 * envelope[:, np.newaxis] * \
+                np.sin(2 * np.pi * t[:, np.newaxis] * freqs)
+            w += rng.normal(0, 0.05, w.shape)
+            ww.writeframes(
+                (np.clip(w, -1, 1) * 32767).astype('<i2').tobytes())
+
+
+def synth_lrc(
+    path: Union[str, pathlib.Path],
+    seconds: float = 10.0,
+    lines_per_minute: float = 20.0
+):
+    """Synthesize an LRC file of evenly spaced lines.
+
+    :param path: path of the LRC file
+
+    :param seconds: duration of lyrics (default: 10.0)
+
+    :param lines_per_minute: density of lines (default: 20.0)
+    """
+
+    interval = 60 / lines_per_minute
+    lines = []
+    for i in range(max(int(seconds / interval), 1)):
+        t = 0.5 + i * interval
+        lines.append('[%02d:%05.2f]测试字幕第%d行' % (t // 60, t % 60, i + 1))
+    lines.append('[%02d:%05.2f]' % (seconds // 60, seconds % 60))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def synth_background(path: Union[str, pathlib.Path], size: Tuple[int, int]):
+    """Synthesize a JPEG background of a color gradient."""
+
+    x = np.linspace(0, 255, size[0], dtype=np.float32)
+    y = np.linspace(0, 255, size[1], dtype=np.float32)
+    arr = np.empty((size[1], size[0], 3), dtype=np.uint8)
+    arr[..., 0] = x[np.newaxis, :]
+    arr[..., 1] = y[:, np.newaxis]
+    arr[..., 2] = 128
+    Image.fromarray(arr).save(path, 'JPEG')
+
+
+############
+# Null sink
+############
+
+def conductor_class(sink: str) -> type:
+    """Get a subclass of ``VideoConductor`` writing frames to a sink.
+
+    :param sink: "null" for a process dropping all frames, or "ffmpeg" for
+    FFmpeg decoding frames into its null muxer (``-f null``)
+    """
+
+    if sink not in AVAILABLE_SINKS:
+        raise ValueError('invalid sink: %s' % sink)
+
+    class BenchmarkConductor(VideoConductor):
+        def ffmpeg_args(self, frame_size: Tuple[int, int], start: int = 0,
+                        nframes: int = -1) -> List[str]:
+            if sink == 'null':
+                return [sys.executable, '-c', NULL_SINK_SCRIPT]
+            args = super().ffmpeg_args(frame_size, start, nframes)
+            return args[:-1] + ['-f', 'null', '-']
+
+    return BenchmarkConductor
+
+
+@contextmanager
+def patched_conductor(sink: str) -> Generator:
+    """A context manager making ``generate()`` write frames to a sink."""
+
+    orig = generate_video.VideoConductor
+    generate_video.VideoConductor = conductor_class(sink)
+    try:
+        yield
+    finally:
+        generate_video.VideoConductor = orig
+
+
+@contextmanager
+def patched_fonts() -> Generator:
+    """A context manager making ``generate()`` render subtitles of all
+    languages with ``BENCHMARK_FONT``, so that results never depend on fonts
+    installed on the machine.
+    """
+
+    orig = generate_video.DEFAULT_FONTS
+    generate_video.DEFAULT_FONTS = {
+        lang: (str(BENCHMARK_FONT), size)
+        for lang, (_, size) in orig.items()}
+    try:
+        yield
+    finally:
+        generate_video.DEFAULT_FONTS = orig
+
+
+#############
+# Components
+#############
+
+def _bench_wave_dots(params: Dict[str, Any], workdir: pathlib.Path) -> Dict:
+    with wave.open(str(workdir / 'in.wav'), 'rb') as wr:
+        nframes = wr.getnframes()
+        start = time.perf_counter()
+        get_wave_dots(wr)
+        elapsed = time.perf_counter() - start
+    return {'seconds': elapsed, 'audio_frames_per_sec': nframes / elapsed}
+
+
+def _bench_wave_envelope(params: Dict[str, Any],
+                         workdir: pathlib.Path) -> Dict:
+    wr = open_audio(workdir / 'in.wav')
+    nframes = wr.getnframes()
+    frames_per_px = params['framerate'] / params['fps'] / params['speed']
+    start = time.perf_counter()
+    get_wave_envelope(wr, frames_per_px, math.ceil(nframes / frames_per_px))
+    elapsed = time.perf_counter() - start
+    wr.close()
+    return {'seconds': elapsed, 'audio_frames_per_sec': nframes / elapsed}
+
+
+def _bench_fade(params: Dict[str, Any], workdir: pathlib.Path) -> Dict:
+    nframes = params['fps']
+    font = ImageFont.truetype(str(BENCHMARK_FONT), 72)
+    start = time.perf_counter()
+    f = fade_in(nframes, '测试字幕', (255, 255, 255, 255), font,
+                shadow_fill=(140, 140, 140, 255),
+                shadow_filter=ImageFilter.BoxBlur(7),
+                size_expand=(10, 10, 10, 10))
+    render_elapsed = time.perf_counter() - start
+    for n in range(nframes):
+        f(n)
+    elapsed = time.perf_counter() - start
+    return {'seconds': elapsed, 'render_seconds': render_elapsed,
+            'fps': nframes / elapsed}
+
+
+def _bench_compose(params: Dict[str, Any], workdir: pathlib.Path) -> Dict:
+    width, height = params['size']
+    nframes = int(params['seconds'] * params['fps'])
+    rng = np.random.default_rng(0)
+    bg = Image.open(workdir / 'bg.jpg').convert('RGB')
+    # NOTE: The layer is of binary alpha in the box of the wave at 1080p,
+    # i.e. 1600x434 with the left-top corner at (160, 323).
+    box = (width // 12, height * 323 // 1080, width * 5 // 6,
+           height * 434 // 1080)
+    layers = np.zeros((2, box[3], box[2], 4), dtype=np.uint8)
+    layers[..., :3] = 255
+    layers[..., 3] = np.where(rng.random(layers.shape[:3]) < 0.3, 255, 0)
+    compositor = Compositor(bg)
+    start = time.perf_counter()
+    for n in range(nframes):
+        compositor.compose([(layers[n % 2], box[:2])])
+    elapsed = time.perf_counter() - start
+    # NOTE: The old path copies and converts the whole frame.
+    images = [Image.fromarray(layer, 'RGBA') for layer in layers]
+    start = time.perf_counter()
+    for n in range(nframes):
+        frame = bg.copy()
+        frame.paste(images[n % 2], box[:2], images[n % 2])
+        np.asarray(frame.convert('RGB'))
+    old_elapsed = time.perf_counter() - start
+    return {'seconds': elapsed, 'fps': nframes / elapsed,
+            'old_seconds': old_elapsed, 'speedup': old_elapsed / elapsed}
+
+
+def _bench_conductor(params: Dict[str, Any], workdir: pathlib.Path) -> Dict:
+    width, height = params['size']
+    nframes = int(params['seconds'] * params['fps'])
+    rng = np.random.default_rng(0)
+    # NOTE: Frames are precomputed, so only the conductor is measured.
+    frames = rng.integers(0, 256, (2, height, width, 3), dtype=np.uint8)
+    profiler = RenderProfiler()
+    vc = conductor_class(params['sink'])(
+        workdir / 'out.mp4', (width, height), params['fps'],
+        lambda n: frames[n % 2], 'h264', profiler=profiler)
+    start = time.perf_counter()
+    vc.conduct(nframes, subprocess.DEVNULL, subprocess.DEVNULL, _callback)
+    elapsed = time.perf_counter() - start
+    return {'seconds': elapsed, 'fps': nframes / elapsed,
+            'report': profiler.report()}
+
+
+def _bench_generate(params: Dict[str, Any], workdir: pathlib.Path) -> Dict:
+    report_file = workdir / 'report.json'
+    # NOTE: Every run analyses the audio again in a fresh cache directory,
+    # otherwise runs after the first one only measure loading the caches.
+    with tempfile.TemporaryDirectory(dir=workdir) as cache_dir:
+        start = time.perf_counter()
+        with patched_conductor(params['sink']), patched_fonts():
+            ok = generate_video.generate(
+                workdir / 'out.mp4', params['size'], params['fps'], 'h264',
+                10000, params['speed'], workdir / 'in.wav', None, None,
+                workdir / 'bg.jpg', {'zh': workdir / 'in.lrc'},
+                subprocess.DEVNULL, subprocess.DEVNULL, report_file,
+                cache_dir=cache_dir)
+        elapsed = time.perf_counter() - start
+    if not ok:
+        raise RuntimeError('generation failed')
+    with open(report_file, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+    return {'seconds': elapsed, 'fps': report['nframes'] / elapsed,
+            'report': report}
+
+
+def _callback(d: dict):
+    if d['status'] == 'error':
+        raise d['err']
+
+
+COMPONENTS: Dict[str, Callable[[Dict[str, Any], pathlib.Path], Dict]] = {
+    'wave_dots': _bench_wave_dots,
+    'wave_envelope': _bench_wave_envelope,
+    'fade': _bench_fade,
+    'compose': _bench_compose,
+    'conductor': _bench_conductor,
+    'generate': _bench_generate
+}
+
+
+def get_peak_rss() -> Union[int, None]:
+    """Get the peak resident set size (unit: byte) of the current process, or
+    ``None`` if unknown.
+    """
+
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # NOTE: It is in bytes on macOS but in kilobytes on Linux.
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def run_component(
+    name: str,
+    params: Dict[str, Any],
+    workdir: Union[str, pathlib.Path]
+) -> Dict[str, Any]:
+    """Run a component once in the current process.
+
+    :returns: a dict of results, including ``peak_rss``, or ``error`` and
+    ``traceback`` if failed
+    NOTE: A failed run has no timings, and it is counted in ``failed`` of
+    the component by ``run_benchmarks()``.
+    """
+
+    try:
+        result = COMPONENTS[name](params, pathlib.Path(workdir))
+    except Exception as e:
+        result = {'error': '%s: %s' % (type(e).__name__, e),
+                  'traceback': traceback.format_exc()}
+    result['peak_rss'] = get_peak_rss()
+    return result
+
+
+def run_benchmarks(
+    params: Dict[str, Any],
+    components: List[str],
+    repeat: int = 1,
+    isolate: bool = True
+) -> Dict[str, Any]:
+    """Run benchmarks of components.
+
+    :param params: a dict of "seconds", "framerate", "nchannels",
+    "lines_per_minute", "size", "fps", "speed" and "sink"
+
+    :param components: names of components in ``COMPONENTS``
+
+    :param repeat: the number of runs of every component (default: 1)
+
+    :param isolate: Whether to run every component in a fresh process, so
+    that its peak RSS is not affected by others. (default: True)
+
+    :returns: a JSON-serializable dict of results, where every component has
+    its runs, the number of ``failed`` runs and the best time of successful
+    runs (or ``None`` if all runs failed)
+    """
+
+    results = {
+        'version': BENCHMARK_VERSION,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': get_environment(),
+        'params': params,
+        'components': {}
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = pathlib.Path(workdir)
+        synth_wav(workdir / 'in.wav', params['seconds'], params['framerate'],
+                  params['nchannels'])
+        synth_lrc(workdir / 'in.lrc', params['seconds'],
+                  params['lines_per_minute'])
+        synth_background(workdir / 'bg.jpg', params['size'])
+
+        for name in components:
+            runs = []
+            for _ in range(repeat):
+                if isolate:
+                    with ProcessPoolExecutor(
+                            1, mp.get_context('spawn')) as executor:
+                        runs.append(executor.submit(
+                            run_component, name, params, workdir).result())
+                else:
+                    runs.append(run_component(name, params, workdir))
+            ok_runs = [r for r in runs if 'error' not in r]
+            results['components'][name] = {
+                'runs': runs,
+                'failed': len(runs) - len(ok_runs),
+                'best_seconds': min((r['seconds'] for r in ok_runs),
+                                    default=None)
+            }
+    return results
+
+
+def get_environment() -> Dict[str, Any]:
+    """Get versions of the interpreter, modules and the source tree."""
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pillow': PIL.__version__,
+        'commit': commit
+    }
+
+
+def compare(new: Dict[str, Any], old: Dict[str, Any]) -> Dict[str, float]:
+    """Compare best times of components in two results.
+
+    :returns: a dict of speedups (old time / new time) by component names
+    """
+
+    speedups = {}
+    for name, d in new['components'].items():
+        old_d = old['components'].get(name)
+        if old_d is None or not old_d['best_seconds'] or \
+                not d['best_seconds']:
+            continue
+        speedups[name] = old_d['best_seconds'] / d['best_seconds']
+    return speedups
+
+
+def main(argv: Union[List[str], None] = None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the rendering pipeline.')
+    parser.add_argument('-o', '--output', default='benchmark.json',
+                        help='path of the JSON results')
+    parser.add_argument('--compare', help='path of previous JSON results')
+    parser.add_argument('--components', nargs='+', default=list(COMPONENTS),
+                        choices=list(COMPONENTS))
+    parser.add_argument('--seconds', type=float, default=10.0,
+                        help='duration of the synthesized track')
+    parser.add_argument('--framerate', type=int, default=44100)
+    parser.add_argument('--nchannels', type=int, default=2)
+    parser.add_argument('--lines-per-minute', type=float, default=20.0)
+    parser.add_argument('--size', default='1920x1080',
+                        help='size of frames, e.g. 1920x1080')
+    parser.add_argument('--fps', type=int, default=60)
+    parser.add_argument('--speed', type=int, default=5)
+    parser.add_argument('--sink', default='null', choices=AVAILABLE_SINKS)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--no-isolate', action='store_true',
+                        help='run all components in the current process')
+    args = parser.parse_args(argv)
+
+    params = {
+        'seconds': args.seconds,
+        'framerate': args.framerate,
+        'nchannels': args.nchannels,
+        'lines_per_minute': args.lines_per_minute,
+        'size': tuple(int(x) for x in args.size.split('x')),
+        'fps': args.fps,
+        'speed': args.speed,
+        'sink': args.sink
+    }
+    results = run_benchmarks(params, args.components, args.repeat,
+                             not args.no_isolate)
+    if args.compare is not None:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            results['speedups'] = compare(results, json.load(f))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+    failed = False
+    for name, d in results['components'].items():
+        for r in d['runs']:
+            if 'error' in r:
+                failed = True
+                print('%-14s FAILED' % name, file=sys.stderr)
+                print(r['traceback'], file=sys.stderr)
+        if d['best_seconds'] is not None:
+            line = '%-14s %.3fs' % (name, d['best_seconds'])
+            if name in results.get('speedups', {}):
+                line += ' (x%.2f)' % results['speedups'][name]
+            print(line)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,11 +3,13 @@
 """A module for text special effects."""
 
 
-import math
+from collections import OrderedDict
 from datetime import timedelta
 from functools import partial
-from typing import Any, Callable, Generator, List, Literal, Tuple, Union
+from typing import (Any, Callable, Generator, Hashable, List, Literal, Tuple,
+                    Union)
 
+import numpy as np
 import pylrc
 import srt
 from PIL import Image, ImageDraw, ImageFilter, ImageFont
@@ -43,12 +45,220 @@ class SrtWithFadeLine:
         return '%s(%s)' % (type(self).__name__, attrs_str)
 
 
+class SpriteCache:
+    """A class for a least recently used (LRU) cache of premultiplied RGBA
+    sprites.
+
+    A sprite is rasterized only once at full opacity and stored with its color
+    channels premultiplied by alpha, so any other opacity of it is produced by
+    scaling all its channels uniformly, which is much cheaper than drawing and
+    filtering text again.
+    """
+
+    def __init__(self, max_bytes: int = 268435456):
+        """A sprite cache object.
+
+        :param max_bytes: The maximum total bytes of cached sprites. The least
+        recently used sprites are dropped when exceeding it.
+        (default: 268435456, i.e. 256 MiB)
+        """
+
+        self.max_bytes = max_bytes
+        self._sprites: OrderedDict = OrderedDict()
+        self._nbytes = 0
+
+    def get(
+        self,
+        key: Hashable,
+        render: Callable[[], Image.Image],
+        alpha: int = 255
+    ) -> np.ndarray:
+        """Get a sprite with scaled opacity.
+
+        :param key: a hashable key identifying the sprite
+
+        :param render: a function rendering the sprite as an ``Image.Image``
+        object with mode RGBA at full opacity, which is only called if the
+        sprite is not cached
+
+        :param alpha: opacity of the sprite from 0 to 255 (default: 255)
+
+        :returns: a ``numpy.ndarray`` of uint8 with shape (H, W, 4) as the
+        premultiplied sprite
+        NOTE: The returned array may be shared, so never modify it in place.
+        """
+
+        if key in self._sprites:
+            self._sprites.move_to_end(key)
+            arr = self._sprites[key]
+        else:
+            arr = premultiply(np.asarray(render()))
+            self._sprites[key] = arr
+            self._nbytes += arr.nbytes
+            while self._nbytes > self.max_bytes and len(self._sprites) > 1:
+                _, dropped = self._sprites.popitem(last=False)
+                self._nbytes -= dropped.nbytes
+
+        if alpha >= 255:
+            return arr
+        return ((arr.astype(np.uint16) * alpha + 127) // 255).astype(np.uint8)
+
+    def clear(self):
+        """Drop all cached sprites."""
+
+        self._sprites.clear()
+        self._nbytes = 0
+
+
+class SubtitleTimeline:
+    """A class for a timeline of subtitle lines with fast lookup by frames.
+
+    Lines are intervals of frames sorted by their start frames in NumPy
+    arrays. Since no line is longer than the longest one, lines active at
+    frame ``n`` must start in the window of that length before ``n``, which
+    is found by binary search. So lookup costs O(log N + M), where M is the
+    number of lines starting in the window (usually the active ones only),
+    and it is stateless, i.e. frames can be looked up in any order.
+    """
+
+    def __init__(self, intervals: List[Tuple[int, int, Any]] = ()):
+        """A subtitle timeline object.
+
+        :param intervals: a list of tuples (start frame, end frame, item),
+        where the end frame is excluded and an item is any object of the line
+        (e.g. its generation function)
+        NOTE: Lines may overlap.
+        """
+
+        intervals = sorted(intervals, key=lambda t: t[0])
+        self._starts = np.array([t[0] for t in intervals], dtype=np.int64)
+        self._ends = np.array([t[1] for t in intervals], dtype=np.int64)
+        self._items = [t[2] for t in intervals]
+        self._max_length = int((self._ends - self._starts).max()) \
+            if intervals else 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def active(self, n: int) -> List[Tuple[int, Any]]:
+        """Get all lines active at the ``n``-th frame.
+
+        :returns: a list of tuples (start frame, item) sorted by start frames
+        """
+
+        lo = np.searchsorted(self._starts, n - self._max_length, 'right')
+        hi = np.searchsorted(self._starts, n, 'right')
+        return [(int(self._starts[i]), self._items[i])
+                for i in range(lo, hi) if self._ends[i] > n]
+
+    @property
+    def starts(self) -> np.ndarray: return self._starts
+
+    @property
+    def ends(self) -> np.ndarray: return self._ends
+
+
+def scale_alpha(arr: np.ndarray, alpha: int) -> np.ndarray:
+    """Scale the alpha channel of an RGBA array.
+
+    :param arr: a ``numpy.ndarray`` of uint8 with shape (H, W, 4)
+
+    :param alpha: opacity from 0 (fully transparent) to 255 (unchanged)
+
+    :returns: a new ``numpy.ndarray`` with the same color channels
+    """
+
+    out = arr.copy()
+    out[..., 3] = (arr[..., 3].astype(np.uint16) * alpha + 127) // 255
+    return out
+
+
+def premultiply(arr: np.ndarray) -> np.ndarray:
+    """Premultiply the color channels of an RGBA array by its alpha channel.
+
+    :param arr: a ``numpy.ndarray`` of uint8 with shape (H, W, 4)
+
+    :returns: a new ``numpy.ndarray`` with the same alpha channel
+    """
+
+    alpha = arr[..., 3:].astype(np.uint16)
+    out = np.empty_like(arr)
+    out[..., :3] = (arr[..., :3] * alpha + 127) // 255
+    out[..., 3] = arr[..., 3]
+    return out
+
+
 ##################
 # Special Effects
 ##################
 
-def fade(
-    nframes: int,
+class Fade:
+    """A class for a fading special effect of a raster, which is also a
+    generation function.
+
+    The raster is rendered only once at full opacity, and every frame is
+    produced by multiplying its alpha channel by a precomputed opacity level.
+    """
+
+    def __init__(
+        self,
+        nframes: int,
+        base: Image.Image,
+        mode: Literal['in', 'out'] = 'in'
+    ):
+        """A fading special effect object.
+
+        :param nframes: the number of frames the special effect lasts
+
+        :param base: an ``Image.Image`` object with mode RGBA at full opacity
+
+        :param mode: specify if fading in or fading out
+        """
+
+        if mode not in ('in', 'out'):
+            raise ValueError('invalid mode')
+
+        self.nframes = nframes
+        self.mode = mode
+        self._base = base
+        self._arr = np.asarray(base)
+        # opacity levels of frames from 0 to ``nframes``
+        levels = np.floor(
+            np.arange(nframes + 1) / max(nframes, 1) * 255 + 0.5)
+        if mode == 'out':
+            levels = 255 - levels
+        self._levels = levels.astype(np.uint16)
+
+    def __call__(self, n: int) -> Image.Image:
+        """Get the ``n``-th frame.
+
+        NOTE: ``n`` is clipped between 0 and ``nframes``.
+
+        :returns: an ``Image.Image`` object with mode RGBA
+        """
+
+        level = self._levels[min(max(n, 0), self.nframes)]
+        if level == 255:
+            return self._base.copy()
+        return Image.fromarray(scale_alpha(self._arr, level), 'RGBA')
+
+    def frames(self) -> np.ndarray:
+        """Get all frames from 0 to ``nframes - 1`` at once.
+
+        :returns: a ``numpy.ndarray`` of uint8 with shape (nframes, H, W, 4)
+        """
+
+        out = np.repeat(self._arr[np.newaxis], self.nframes, axis=0)
+        out[..., 3] = (self._arr[np.newaxis, ..., 3].astype(np.uint16) *
+                       self._levels[:self.nframes, np.newaxis, np.newaxis] +
+                       127) // 255
+        return out
+
+    @property
+    def base(self) -> Image.Image: return self._base
+
+
+def render_text(
     text: Union[str, bytes],
     fill: Union[_Ink, None] = None,
     font: Union[ImageFont.FreeTypeFont, None] = None,
@@ -62,41 +272,24 @@ def fade(
     embedded_color: bool = False,
     shadow_fill: Union[_Ink, None] = None,
     shadow_filter: Union[ImageFilter.Filter, None] = None,
-    size_expand: Union[Tuple[int, int, int, int], None] = None,
-    mode: Literal['in', 'out'] = 'in'
-) -> Callable[[int], Image.Image]: 
-    """Create a RGBA image of the string with fade-in special effect at the
-    given position and make it into a generation function.
-    
-    "Fade-in" means the text animated from being fully transparent to the
-    maximum opacity linearly.
-
-    :param nframes: the number of frames the special effect lasts
+    size_expand: Union[Tuple[int, int, int, int], None] = None
+) -> Image.Image:
+    """Create a RGBA image of the string with an optional shadow at full
+    opacity.
 
     :param shadow_filter: the filter of optional shadow of text
 
     :param size_expand: how the size of image expands
     NOTE: The order of elements is (left, top, right, bottom).
 
-    :param mode: specify if fading in or fading out
-
     See documentation of ``PIL.ImageDraw.ImageDraw.multiline_text()`` for other
     paramenters.
-    NOTE: ``fill`` and ``stroke_fill`` must be a 4-tuple, and with ``None``
-    value the function still returns the generation function but with
-    unexpected results.. ``font`` must be an ``ImageFont.FreeTypeFont`` object.
+    NOTE: ``font`` must be an ``ImageFont.FreeTypeFont`` object.
 
-    :returns: A generation function whose ``n`` should begin with 0, returning
-    an ``Image.Image`` object with mode RGBA, background color (0, 0, 0, 0) and
-    left-up corner position (0, 0).
-
-    NOTE: This function is so awful and ugly and I have found how to code it
-    better. But I don't have enough time and willingness to rewrite it.
+    :returns: an ``Image.Image`` object with mode RGBA and background color
+    (0, 0, 0, 0), where the text is centered
     """
 
-    if mode not in ('in', 'out'):
-        raise ValueError('invalid mode')
-
     def _multiline_check(text):
         """See ``_multiline_check()`` source code in ``PIL.ImageDraw``."""
         split_character = '\n' if isinstance(text, str) else b'\n'
@@ -111,61 +304,77 @@ def fade(
         size = (size[0] + size_expand[0] + size_expand[2],
                 size[1] + size_expand[1] + size_expand[3])
     center = (size[0] // 2, size[1] // 2)
-    if fill is not None:
-        if mode == 'in':
-            color: Callable[[int], Tuple] = (
-                lambda n: (
-                    *fill[:3],
-                    math.floor(n / nframes * fill[3] + 0.5)))
-        else:
-            color: Callable[[int], Tuple] = (
-                lambda n: (
-                    *fill[:3],
-                    255 - math.floor(n / nframes * fill[3] + 0.5)))
-    else:
-        color: Callable[[int], None] = lambda n: None
-    if stroke_fill is not None:
-        if mode == 'in':
-            stroke_color: Callable[[int], Tuple] = (
-                lambda n: (
-                    *stroke_fill[:3],
-                    math.floor(n / nframes * stroke_fill[3] + 0.5)))
-        else:
-            stroke_color: Callable[[int], Tuple] = (
-                lambda n: (
-                    *stroke_fill[:3],
-                    255 - math.floor(n / nframes * stroke_fill[3] + 0.5)))
-    else:
-        stroke_color: Callable[[int], None] = lambda n: None
+
+    img = Image.new('RGBA', size)
+    draw = ImageDraw.Draw(img)
     if shadow_filter is not None:
         if shadow_fill is None:
-            shadow_fill = (255, 255, 255)
-        if mode == 'in':
-            shadow_color: Callable[[int], Tuple] = (
-                lambda n: (
-                    *shadow_fill[:3],
-                    math.floor(n / nframes * shadow_fill[3] + 0.5)))
-        else:
-            shadow_color: Callable[[int], Tuple] = (
-                lambda n: (
-                    *shadow_fill[:3],
-                    255 - math.floor(n / nframes * shadow_fill[3] + 0.5)))
-
-    def genfunc(n: int) -> Image.Image:
-        img = Image.new('RGBA', size)
-        draw = ImageDraw.Draw(img)
-        if shadow_filter is not None:
-            draw.text(center, text, shadow_color(n), font, 'mm', spacing,
-                      align, direction, features, language, stroke_width,
-                      stroke_color(n), embedded_color)
-            img = img.filter(shadow_filter)
-            draw = ImageDraw.Draw(img)
-        draw.text(center, text, color(n), font, 'mm', spacing, align,
-                  direction, features, language, stroke_width, stroke_color(n),
+            shadow_fill = (255, 255, 255, 255)
+        draw.text(center, text, shadow_fill, font, 'mm', spacing, align,
+                  direction, features, language, stroke_width, stroke_fill,
                   embedded_color)
-        return img
+        img = img.filter(shadow_filter)
+        draw = ImageDraw.Draw(img)
+    draw.text(center, text, fill, font, 'mm', spacing, align, direction,
+              features, language, stroke_width, stroke_fill, embedded_color)
+
+    return img
+
+
+def fade(
+    nframes: int,
+    text: Union[str, bytes],
+    fill: Union[_Ink, None] = None,
+    font: Union[ImageFont.FreeTypeFont, None] = None,
+    spacing: float = 4,
+    align: Literal['left', 'center', 'right'] = 'left',
+    direction: Union[Literal['rtl', 'ltr', 'ttb'], None] = None,
+    features: Union[Any, None] = None,
+    language: Union[str, None] = None,
+    stroke_width: int = 0,
+    stroke_fill: Union[_Ink, None] = None,
+    embedded_color: bool = False,
+    shadow_fill: Union[_Ink, None] = None,
+    shadow_filter: Union[ImageFilter.Filter, None] = None,
+    size_expand: Union[Tuple[int, int, int, int], None] = None,
+    mode: Literal['in', 'out'] = 'in'
+) -> Fade: 
+    """Create a RGBA image of the string with fade-in special effect at the
+    given position and make it into a generation function.
+    
+    "Fade-in" means the text animated from being fully transparent to the
+    maximum opacity linearly.
+
+    :param nframes: the number of frames the special effect lasts
+
+    :param shadow_filter: the filter of optional shadow of text
+
+    :param size_expand: how the size of image expands
+    NOTE: The order of elements is (left, top, right, bottom).
+
+    :param mode: specify if fading in or fading out
+
+    See documentation of ``PIL.ImageDraw.ImageDraw.multiline_text()`` for other
+    paramenters.
+    NOTE: ``fill``, ``stroke_fill`` and ``shadow_fill`` are the colors at the
+    maximum opacity. ``font`` must be an ``ImageFont.FreeTypeFont`` object.
+
+    :returns: A ``Fade`` object as the generation function whose ``n`` should
+    begin with 0, returning an ``Image.Image`` object with mode RGBA,
+    background color (0, 0, 0, 0) and left-up corner position (0, 0).
+
+    NOTE: The text and its shadow are rasterized only once, since drawing
+    text with a more transparent color is the same as scaling the alpha
+    channel of the opaque one, as far as the background is transparent.
+    """
+
+    if mode not in ('in', 'out'):
+        raise ValueError('invalid mode')
 
-    return genfunc
+    img = render_text(text, fill, font, spacing, align, direction, features,
+                      language, stroke_width, stroke_fill, embedded_color,
+                      shadow_fill, shadow_filter, size_expand)
+    return Fade(nframes, img, mode)
 
 fade_in = partial(fade, mode='in')
 fade_out = partial(fade, mode='out')
@@ -3,15 +3,167 @@
 """A module for video conductor."""
 
 
+import hashlib
+import mmap
+import multiprocessing as mp
 import pathlib
+import queue
 import subprocess
+import threading
 import time
-from io import IOBase
-from typing import Any, Callable, Dict, Iterable, Tuple, Union
+from io import BytesIO, IOBase
+from typing import (Any, Callable, Dict, Generator, Iterable, List, Literal,
+                    Tuple, Union)
 
 import numpy as np
 from PIL import Image
 
+from .profiling import RenderProfiler
+
+
+# FFmpeg demuxer and decoder arguments of every available input format
+INPUT_FORMATS = {
+    'rawvideo': ['-f', 'rawvideo'],
+    'mjpeg': ['-f', 'image2pipe', '-vcodec', 'mjpeg'],
+    'png': ['-f', 'image2pipe', '-vcodec', 'png']
+}
+# Image modes of every available pixel format of raw video frames
+PIX_FMT_MODES = {
+    'rgb24': 'RGB',
+    'rgba': 'RGBA'
+}
+
+
+class _RepeatFrame:
+    """A class for the sentinel of repeating the previous frame."""
+
+    def __repr__(self):
+        return 'REPEAT_FRAME'
+
+
+# A sentinel returned by a generation function, meaning that the frame is
+# identical to the previous one, thus it is neither rendered nor encoded again
+REPEAT_FRAME = _RepeatFrame()
+
+# Status of a frame rendered by a worker process
+_WORKER_END = 0
+_WORKER_NEW = 1
+_WORKER_REPEAT = 2
+
+# State shared with forked worker processes of parallel rendering
+# NOTE: Worker processes are forked after it is set, so that closures used as
+# generation functions are inherited instead of being pickled.
+_worker_state: Dict[str, Any] = {}
+
+
+def order_independent(genfunc: Callable) -> Callable:
+    """Mark a generation function as order-independent.
+
+    An order-independent generation function is a pure function of ``n``,
+    i.e. any frame can be generated in isolation and in any order. Only these
+    generation functions can be rendered in parallel by ``VideoConductor``,
+    while others always fall back to serial rendering.
+
+    :param genfunc: a generation function
+
+    :returns: the same generation function
+    """
+
+    genfunc.order_independent = True
+    return genfunc
+
+
+def is_order_independent(genfunc: Callable) -> bool:
+    """Check if a generation function is marked as order-independent."""
+
+    return getattr(genfunc, 'order_independent', False)
+
+
+def _render_frame_worker(n: int, slot: int) -> int:
+    """Render the ``n``-th frame into a slot of the shared frame buffer.
+
+    :returns: ``_WORKER_END`` if reaching the end of generation,
+    ``_WORKER_REPEAT`` if the frame repeats the previous one, otherwise
+    ``_WORKER_NEW``
+    """
+
+    frame = _worker_state['genfunc'](n)
+    if frame is None:
+        return _WORKER_END
+    if frame is REPEAT_FRAME:
+        return _WORKER_REPEAT
+    if not isinstance(frame, np.ndarray):
+        if frame.mode != _worker_state['mode']:
+            frame = frame.convert(_worker_state['mode'])
+        frame = np.asarray(frame)
+    _worker_state['slots'][slot] = frame
+    return _WORKER_NEW
+
+
+class _FrameWriter:
+    """A class for writing encoded frames to a pipe in a dedicated thread.
+
+    Frames are put into a bounded queue and written by the thread, so that
+    generating the next frame overlaps with writing the current one, since
+    writing to a pipe releases the GIL. The generating thread blocks only if
+    the queue is full.
+    """
+
+    def __init__(self, pipe: IOBase, queue_size: int):
+        """A frame writer object.
+
+        :param pipe: a writable binary file object (e.g. stdin of FFmpeg)
+
+        :param queue_size: the maximum number of frames waiting to be written
+        """
+
+        self._pipe = pipe
+        self._queue = queue.Queue(queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            payload = self._queue.get()
+            if payload is None:
+                return
+            # NOTE: Keep consuming after an error, so that the generating
+            # thread never blocks on a full queue.
+            if self._error is None:
+                try:
+                    self._pipe.write(payload)
+                except Exception as e:
+                    self._error = e
+
+    def write(self, payload: Union[bytes, memoryview]):
+        """Put an encoded frame into the queue.
+
+        NOTE: The payload must not be modified after being put, since it is
+        written later.
+        """
+
+        if self._error is not None:
+            raise self._error
+        self._queue.put(payload)
+
+    def close(self):
+        """Wait for all queued frames to be written and stop the thread.
+
+        NOTE: It raises the first error in the thread, if any.
+        """
+
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def qsize(self) -> int:
+        """Get the number of frames waiting to be written."""
+
+        return self._queue.qsize()
+
 
 class VideoConductor:
     """A class for video conductor."""
@@ -26,7 +178,17 @@ class VideoConductor:
         bv: Union[int, None] = None,
         audiofile: Union[str, pathlib.Path, None] = None,
         acodec: Union[str, None] = None,
-        filter_complex: Union[str, None] = None
+        filter_complex: Union[str, None] = None,
+        input_format: Literal['rawvideo', 'mjpeg', 'png'] = 'rawvideo',
+        pix_fmt: Literal['rgb24', 'rgba'] = 'rgb24',
+        out_pix_fmt: Union[str, None] = 'yuv420p',
+        workers: int = 1,
+        max_inflight: Union[int, None] = None,
+        dedup: bool = False,
+        queue_size: int = 4,
+        profiler: Union[RenderProfiler, None] = None,
+        threads: Union[int, None] = None,
+        preset: Union[str, None] = None
     ):
         """A video conductor object.
         
@@ -38,10 +200,13 @@ class VideoConductor:
 
         :param genfunc: generation function
         NOTE: ``genfunc`` should accept an integer ``n`` referring to the
-        ``n``-th frame and return an HxWx3 array as the frame pixels or a
-        PIL.Image.Image object with "RGB" mode (returns will be regarded as an
-        Image object if it is not an array), returning ``None`` only if
-        reaching the end of generation.
+        ``n``-th frame and return an HxWx3 (or HxWx4 if ``pix_fmt`` is
+        "rgba") uint8 array as the frame pixels or a PIL.Image.Image object
+        with "RGB" mode (returns will be regarded as an Image object if it is
+        not an array), returning ``None`` only if reaching the end of
+        generation. It may also return ``REPEAT_FRAME`` if the frame is
+        identical to the previous one, which must be decided by ``n`` only
+        (e.g. without comparing with the previously returned frame).
 
         :param vcodec: FFmpeg video codec string (e.g. h264). Use ``None``
         to remove this option in FFmpeg args. (default: None)
@@ -58,6 +223,46 @@ class VideoConductor:
 
         :param filter_complex: FFmpeg filter_complex string. Use ``None``
         to remove this option in FFmpeg args. (default: None)
+
+        :param input_format: How frames are transported through the pipe.
+        "rawvideo" writes the pixel buffer of every frame directly, while
+        "mjpeg" and "png" encode every frame into an image first.
+        (default: "rawvideo")
+
+        :param pix_fmt: Pixel format of raw video frames. It is only used
+        when ``input_format`` is "rawvideo". (default: "rgb24")
+
+        :param out_pix_fmt: FFmpeg output pixel format. Use ``None`` to remove
+        this option in FFmpeg args. (default: "yuv420p")
+
+        :param workers: The number of worker processes rendering frames. Only
+        generation functions marked by ``order_independent()`` are rendered in
+        parallel, and others fall back to serial rendering. (default: 1)
+
+        :param max_inflight: The number of at most frames being rendered or
+        waiting to be written at the same time in parallel rendering. Use
+        ``None`` for twice of ``workers``. (default: None)
+
+        :param dedup: Whether to detect frames identical to the previous ones
+        by hashes of their pixels, and reuse the previous encoded frames
+        instead of encoding them again. It is useful when ``input_format`` is
+        not "rawvideo". (default: False)
+
+        :param queue_size: The maximum number of encoded frames waiting to be
+        written to FFmpeg by a dedicated writer thread. Use 0 to write frames
+        in the generating thread. (default: 4)
+        NOTE: Frames are copied when queued in raw video mode, since arrays
+        returned by generation functions may be reused buffers.
+
+        :param profiler: The ``RenderProfiler`` object collecting timings of
+        frames. Use ``None`` for a new one. (default: None)
+        NOTE: Generation functions may add timings of their own stages to it.
+
+        :param threads: The number of threads of FFmpeg encoding the video.
+        Use ``None`` to remove this option in FFmpeg args. (default: None)
+
+        :param preset: FFmpeg encoder preset (e.g. ultrafast for drafts). Use
+        ``None`` to remove this option in FFmpeg args. (default: None)
         """
         
         self._outfile = outfile
@@ -69,13 +274,24 @@ class VideoConductor:
         self._audiofile = audiofile
         self._acodec = acodec
         self._filter_complex = filter_complex
+        self._input_format = input_format
+        self._pix_fmt = pix_fmt
+        self._out_pix_fmt = out_pix_fmt
+        self._workers = workers
+        self._max_inflight = max_inflight
+        self._dedup = dedup
+        self._queue_size = queue_size
+        self._profiler = RenderProfiler() if profiler is None else profiler
+        self._threads = threads
+        self._preset = preset
 
     def conduct(
         self,
         nframes: int = -1,
         stdout: Union[int, IOBase, None] = None,
         stderr: Union[int, IOBase, None] = None,
-        callback: Union[Callable[[Dict], Any], None] = None
+        callback: Union[Callable[[Dict], Any], None] = None,
+        start: int = 0
     ):
         """Conduct the video.
         
@@ -93,11 +309,39 @@ class VideoConductor:
 
         :param callback: Callback function. The function should accept a dict
         with many values. (default: None)
+        NOTE: ``current_frame`` of a repeated frame is the previous frame, and
+        ``repeated_frame`` is ``True`` in the dict. ``queued_frames`` is the
+        number of frames waiting to be written by the writer thread, and
+        "after_write_frame" means that the frame has been queued if
+        ``queue_size`` is not 0. ``timings`` is a dict of timings (unit:
+        second) of the frame, ``fps`` is the rolling frames per second and
+        ``eta`` is the estimated seconds until the end (or ``None`` if
+        unknown). The dict of status "finish" has a ``report`` from
+        ``RenderProfiler.report()``.
+        NOTE: Timings include "genfunc", "convert", "encode", "write" and
+        "frame" (the whole frame). The "write" timing is the time the
+        generating thread is blocked by writing or queueing. In parallel
+        rendering, "genfunc" is the time waiting for the worker process, and
+        timings added by generation functions in worker processes are lost.
+
+        :param start: The position of the first generated frame, so that
+        frames from ``start`` to ``start + nframes - 1`` are conducted, e.g.
+        into a segment of a longer video. (default: 0)
+        NOTE: The audio file is aligned to the frame 0, so only the part of
+        audio from ``start`` is muxed, and it is cut at the end frame if
+        ``nframes`` is not -1.
+        NOTE: If the first frame is ``REPEAT_FRAME``, previous frames are
+        generated until a new one is found.
         """
 
         if not isinstance(nframes, int):
             raise TypeError('nframes should be an integer')
 
+        if not isinstance(start, int):
+            raise TypeError('start should be an integer')
+        if start < 0:
+            raise ValueError('start should not be negative')
+
         if not isinstance(callback, Callable):
             raise TypeError('callback should be callable')
 
@@ -111,66 +355,97 @@ class VideoConductor:
                             '"subprocess" module, an existing file object or '
                             'None')
         
-        # parse args
-        args = ['ffmpeg', '-y', '-f', 'image2pipe', '-vcodec', 'mjpeg',
-                '-r', str(self.fps), '-i', '-']
-        if self.audiofile is not None:
-            args.extend(['-i', self.audiofile])
-        if self.vcodec is not None:
-            args.extend(['-vcodec', self.vcodec])
-        args.extend(['-r', str(self.fps), '-vf', 'scale=%d:%d' % self.size])
-        if self.bv is not None:
-            args.extend(['-b:v', '%dK' % self.bv])
-        if self.acodec is not None:
-            args.extend(['-acodec', self.acodec])
-        if self.filter_complex is not None:
-            args.extend(['-filter_complex', self.filter_complex])
-        args.append(self.outfile)
-
-        ffmpeg_proc = subprocess.Popen(args, stdin=subprocess.PIPE,
-                                       stdout=stdout, stderr=stderr)
-        cur_frame_pos = 0
+        ffmpeg_proc = None
+        writer = None
+        profiler = self.profiler
+        profiler.reset(nframes)
+        cur_frame_pos = start
+        # position of the end frame, or -1 if using all frames
+        end = start + nframes if nframes >= 0 else -1
+        cur_frame = None
+        # the previous frame, its encoded bytes and its hash
+        last_frame = payload = digest = None
+        parallel = self.workers > 1 and \
+            is_order_independent(self.genfunc) and \
+            'fork' in mp.get_all_start_methods()
+        if parallel:
+            frames = self._iter_frames_parallel(start, end)
+        else:
+            frames = self._iter_frames(start, end)
+        # NOTE: A queued payload is written later, and a deduplicated frame
+        # from a shared slot is released before its payload is written again,
+        # so neither may share memory with a reused frame buffer.
+        copy = self.queue_size > 0 or (parallel and self.dedup)
         try:
-            while True:
-                if nframes >= 0 and cur_frame_pos >= nframes:
-                    callback({
-                        'time': time.time(),
-                        'status': 'finish_generating_frames',
-                        'cause': 'reach_nframes_limit',
-                        'ffmpeg_process': ffmpeg_proc,
-                        'current_frame_pos': cur_frame_pos
-                    })
-                    break
-                cur_frame = self.genfunc(cur_frame_pos)
-                if cur_frame is None:
-                    callback({
-                        'time': time.time(),
-                        'status': 'finish_generating_frames',
-                        'cause': 'generate_blank_frame',
-                        'ffmpeg_process': ffmpeg_proc,
-                        'current_frame_pos': cur_frame_pos
-                    })
-                    break
+            for cur_frame_pos, cur_frame in frames:
+                if cur_frame is REPEAT_FRAME:
+                    if last_frame is None:
+                        raise ValueError('the first frame can not be repeated')
+                    repeated = True
+                elif self.dedup:
+                    with profiler.timer('digest'):
+                        cur_digest = self._digest_frame(cur_frame)
+                    repeated = cur_digest == digest
+                    digest = cur_digest
+                else:
+                    repeated = False
+                if repeated:
+                    cur_frame = last_frame
+                # NOTE: FFmpeg is launched after the first frame is generated,
+                # since a raw video stream needs the exact size of frames.
+                if ffmpeg_proc is None:
+                    ffmpeg_proc = self._launch(self._frame_size(cur_frame),
+                                               stdout, stderr, start, nframes)
+                    if self.queue_size > 0:
+                        writer = _FrameWriter(ffmpeg_proc.stdin,
+                                              self.queue_size)
                 callback({
                     'time': time.time(),
                     'status': 'before_write_frame',
                     'ffmpeg_process': ffmpeg_proc,
                     'current_frame_pos': cur_frame_pos,
-                    'current_frame': cur_frame
+                    'current_frame': cur_frame,
+                    'repeated_frame': repeated,
+                    'queue_size': self.queue_size,
+                    'queued_frames': writer.qsize() if writer else 0
                 })
-                if isinstance(cur_frame, np.ndarray):
-                    img = Image.fromarray(cur_frame)
-                else:
-                    img = cur_frame
-                img.save(ffmpeg_proc.stdin, 'JPEG')
+                if not repeated:
+                    payload = self._encode_frame(cur_frame, copy=copy)
+                    last_frame = cur_frame
+                with profiler.timer('write'):
+                    if writer is not None:
+                        writer.write(payload)
+                    else:
+                        ffmpeg_proc.stdin.write(payload)
+                timings = profiler.end_frame(repeated)
                 callback({
                     'time': time.time(),
                     'status': 'after_write_frame',
                     'ffmpeg_process': ffmpeg_proc,
                     'current_frame_pos': cur_frame_pos,
-                    'current_frame': cur_frame
+                    'current_frame': cur_frame,
+                    'repeated_frame': repeated,
+                    'queue_size': self.queue_size,
+                    'queued_frames': writer.qsize() if writer else 0,
+                    'timings': timings,
+                    'fps': profiler.fps,
+                    'eta': profiler.eta
                 })
                 cur_frame_pos += 1
+            else:
+                if end >= 0 and cur_frame_pos >= end:
+                    cause = 'reach_nframes_limit'
+                else:
+                    cause = 'generate_blank_frame'
+                callback({
+                    'time': time.time(),
+                    'status': 'finish_generating_frames',
+                    'cause': cause,
+                    'ffmpeg_process': ffmpeg_proc,
+                    'current_frame_pos': cur_frame_pos
+                })
+            if writer is not None:
+                writer.close()
         except Exception as e:
             # ffmpeg_proc.stdin.close()
             callback({
@@ -181,17 +456,273 @@ class VideoConductor:
                 'current_frame': cur_frame,
                 'err': e
             })
+        finally:
+            frames.close()
+            if writer is not None:
+                try:
+                    writer.close()
+                except Exception:
+                    # NOTE: The error has been handled above.
+                    pass
         
+        if ffmpeg_proc is None:
+            ffmpeg_proc = self._launch(self.size, stdout, stderr, start,
+                                       nframes)
         ffmpeg_proc.stdin.close()
         ffmpeg_proc.wait()
+        profiler.finish()
         callback({
             'time': time.time(),
             'status': 'finish',
             'ffmpeg_process': ffmpeg_proc,
             'current_frame_pos': cur_frame_pos,
-            'current_frame': cur_frame
+            'current_frame': cur_frame,
+            'report': profiler.report()
         })
 
+    def _first_frame(self, n: int) -> Union[np.ndarray, Image.Image, None]:
+        """Generate the first conducted frame at position ``n``.
+
+        NOTE: If it repeats the previous frame, previous frames are generated
+        until a new one is found, since there is no previous frame written.
+        """
+
+        with self.profiler.timer('genfunc'):
+            frame = self.genfunc(n)
+            while frame is REPEAT_FRAME and n > 0:
+                n -= 1
+                frame = self.genfunc(n)
+        return frame
+
+    def _iter_frames(self, start: int, end: int) -> Generator:
+        """Generate frames from ``start`` to ``end - 1`` serially, or to the
+        end of generation if ``end`` is -1.
+
+        :returns: a generator of tuples (frame position, frame)
+        """
+
+        n = start
+        while end < 0 or n < end:
+            if n == start:
+                frame = self._first_frame(n)
+            else:
+                with self.profiler.timer('genfunc'):
+                    frame = self.genfunc(n)
+            if frame is None:
+                return
+            yield n, frame
+            n += 1
+
+    def _iter_frames_parallel(self, start: int, end: int) -> Generator:
+        """Generate frames from ``start`` to ``end - 1`` (or to the end of
+        generation if ``end`` is -1) in worker processes and reorder them.
+
+        The first frame is generated in the current process to get the shape
+        of frames, and worker processes are forked before it is yielded, i.e.
+        before FFmpeg and the writer thread are launched, so that workers
+        never inherit the pipe or a running thread. Then frame positions are
+        dispatched to worker processes,
+        which write rendered frames into slots of an anonymous shared memory
+        buffer. Frames are yielded in strict position order, and at most
+        ``max_inflight`` frames are pending at the same time.
+
+        NOTE: A yielded frame is a view of its slot, which is only valid
+        before the next but one frame is requested, so that a repeated frame
+        can still be written from the previous one. A frame found identical
+        to the previous one by hashing still releases the previous slot.
+
+        :returns: a generator of tuples (frame position, frame)
+        """
+
+        if start == end:
+            return
+        frame = self._first_frame(start)
+        if frame is None:
+            return
+
+        mode = PIX_FMT_MODES[self.pix_fmt]
+        width, height = self._frame_size(frame)
+        shape = (height, width, len(mode))
+        # NOTE: One more slot holds the previous frame.
+        nslots = (self.max_inflight or 2 * self.workers) + 1
+        buf = mmap.mmap(-1, nslots * height * width * len(mode))
+        slots = np.ndarray((nslots, *shape), np.uint8, buf)
+        _worker_state.update(genfunc=self.genfunc, mode=mode, slots=slots)
+        pool = mp.get_context('fork').Pool(self.workers)
+        try:
+            yield start, frame
+
+            free_slots = list(range(nslots))
+            # slot of the previous frame
+            held_slot = None
+            # reorder buffer of pending frames: position -> (slot, result)
+            pending = {}
+            next_pos = start + 1
+            n = start + 1
+            while True:
+                while free_slots and (end < 0 or next_pos < end):
+                    slot = free_slots.pop()
+                    pending[next_pos] = (slot, pool.apply_async(
+                        _render_frame_worker, (next_pos, slot)))
+                    next_pos += 1
+                if n not in pending:
+                    return
+                slot, result = pending.pop(n)
+                with self.profiler.timer('genfunc'):
+                    status = result.get()
+                if status == _WORKER_END:
+                    return
+                elif status == _WORKER_REPEAT:
+                    free_slots.append(slot)
+                    yield n, REPEAT_FRAME
+                else:
+                    yield n, slots[slot]
+                    if held_slot is not None:
+                        free_slots.append(held_slot)
+                    held_slot = slot
+                n += 1
+        finally:
+            pool.terminate()
+            pool.join()
+            _worker_state.clear()
+
+    def ffmpeg_args(
+        self,
+        frame_size: Tuple[int, int],
+        start: int = 0,
+        nframes: int = -1
+    ) -> List[str]:
+        """Get FFmpeg args of conducting the video.
+
+        :param frame_size: size tuple of frames written to the pipe
+
+        :param start: position of the first frame written to the pipe
+        (default: 0)
+
+        :param nframes: the number of at most frames written to the pipe, or
+        -1 if using all frames (default: -1)
+
+        :returns: a list of FFmpeg args
+        """
+
+        args = ['ffmpeg', '-y', *INPUT_FORMATS[self.input_format]]
+        if self.input_format == 'rawvideo':
+            args.extend(['-pix_fmt', self.pix_fmt, '-s', '%dx%d' % frame_size])
+        # NOTE: Frames from ``start`` are shifted to their time in the whole
+        # video, and the output is seeked there, so that the audio (and any
+        # delay in ``filter_complex``) keeps aligned with the frame 0. The
+        # frame rate is set by the demuxer then, since ``-r`` of an input
+        # overrides its offset.
+        window = self.audiofile is not None and start > 0
+        if window:
+            args.extend(['-itsoffset', str(start / self.fps),
+                         '-framerate', str(self.fps), '-i', '-'])
+        else:
+            args.extend(['-r', str(self.fps), '-i', '-'])
+        if self.audiofile is not None:
+            args.extend(['-i', self.audiofile])
+        if window:
+            args.extend(['-ss', str(start / self.fps)])
+        if self.audiofile is not None and nframes >= 0:
+            args.extend(['-t', str(nframes / self.fps)])
+        if self.vcodec is not None:
+            args.extend(['-vcodec', self.vcodec])
+        if self.preset is not None:
+            args.extend(['-preset', self.preset])
+        args.extend(['-r', str(self.fps)])
+        # NOTE: Scaling is unnecessary if frames have already been the
+        # expected size.
+        if tuple(frame_size) != tuple(self.size):
+            args.extend(['-vf', 'scale=%d:%d' % self.size])
+        if self.out_pix_fmt is not None:
+            args.extend(['-pix_fmt', self.out_pix_fmt])
+        if self.bv is not None:
+            args.extend(['-b:v', '%dK' % self.bv])
+        if self.acodec is not None:
+            args.extend(['-acodec', self.acodec])
+        if self.filter_complex is not None:
+            args.extend(['-filter_complex', self.filter_complex])
+        if self.threads is not None:
+            args.extend(['-threads', str(self.threads)])
+        args.append(self.outfile)
+        return args
+
+    def _launch(
+        self,
+        frame_size: Tuple[int, int],
+        stdout: Union[int, IOBase, None],
+        stderr: Union[int, IOBase, None],
+        start: int = 0,
+        nframes: int = -1
+    ) -> subprocess.Popen:
+        """Launch an FFmpeg process reading frames from its stdin."""
+
+        return subprocess.Popen(self.ffmpeg_args(frame_size, start, nframes),
+                                stdin=subprocess.PIPE, stdout=stdout,
+                                stderr=stderr)
+
+    @staticmethod
+    def _frame_size(frame: Union[np.ndarray, Image.Image]) -> Tuple[int, int]:
+        """Get size tuple (width, height) of a frame."""
+
+        if isinstance(frame, np.ndarray):
+            return (frame.shape[1], frame.shape[0])
+        return frame.size
+
+    @staticmethod
+    def _digest_frame(frame: Union[np.ndarray, Image.Image]) -> bytes:
+        """Get a hash of pixels of a frame."""
+
+        if isinstance(frame, np.ndarray):
+            data = memoryview(np.ascontiguousarray(frame)).cast('B')
+        else:
+            data = frame.tobytes()
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def _encode_frame(
+        self,
+        frame: Union[np.ndarray, Image.Image],
+        copy: bool = False
+    ) -> Union[bytes, memoryview]:
+        """Encode a frame into a bytes-like object to be written to the pipe.
+
+        :param copy: Whether the result should never share memory with the
+        frame. (default: False)
+
+        NOTE: A C-contiguous array in raw video mode is exposed as a
+        ``memoryview`` of its own buffer without any copy, unless ``copy`` is
+        True.
+        """
+
+        mode = PIX_FMT_MODES[self.pix_fmt]
+        # Step 1: Convert the frame to the pixel format or an image
+        with self.profiler.timer('convert'):
+            if self.input_format == 'rawvideo':
+                if isinstance(frame, np.ndarray):
+                    if frame.dtype != np.uint8:
+                        raise TypeError('frame array should be of uint8')
+                    if frame.ndim != 3 or frame.shape[2] != len(mode):
+                        raise ValueError('frame array should have %d '
+                                         'channels for %s' %
+                                         (len(mode), self.pix_fmt))
+                elif frame.mode != mode:
+                    frame = frame.convert(mode)
+            else:
+                if isinstance(frame, np.ndarray):
+                    frame = Image.fromarray(frame)
+                if self.input_format == 'mjpeg' and frame.mode != 'RGB':
+                    frame = frame.convert('RGB')
+
+        # Step 2: Serialize the frame
+        with self.profiler.timer('encode'):
+            if self.input_format == 'rawvideo':
+                if isinstance(frame, np.ndarray) and not copy:
+                    return memoryview(np.ascontiguousarray(frame)).cast('B')
+                return frame.tobytes()
+            buf = BytesIO()
+            frame.save(buf, 'JPEG' if self.input_format == 'mjpeg' else 'PNG')
+            return buf.getbuffer()
+
     @property
     def outfile(self): return self._outfile
 
@@ -219,6 +750,36 @@ class VideoConductor:
     @property
     def filter_complex(self): return self._filter_complex
 
+    @property
+    def input_format(self): return self._input_format
+
+    @property
+    def pix_fmt(self): return self._pix_fmt
+
+    @property
+    def out_pix_fmt(self): return self._out_pix_fmt
+
+    @property
+    def workers(self): return self._workers
+
+    @property
+    def max_inflight(self): return self._max_inflight
+
+    @property
+    def dedup(self): return self._dedup
+
+    @property
+    def queue_size(self): return self._queue_size
+
+    @property
+    def profiler(self): return self._profiler
+
+    @property
+    def threads(self): return self._threads
+
+    @property
+    def preset(self): return self._preset
+
     @outfile.setter
     def outfile(self, val: Union[str, pathlib.Path]):
 
@@ -294,4 +855,82 @@ class VideoConductor:
 
         if not isinstance(val, str) and val is not None:
             raise TypeError('argument should be str or None')
-        self._filter_complex = val
\ No newline at end of file
+        self._filter_complex = val
+
+    @input_format.setter
+    def input_format(self, val: Literal['rawvideo', 'mjpeg', 'png']):
+
+        if val not in INPUT_FORMATS:
+            raise ValueError('invalid input format')
+        self._input_format = val
+
+    @pix_fmt.setter
+    def pix_fmt(self, val: Literal['rgb24', 'rgba']):
+
+        if val not in PIX_FMT_MODES:
+            raise ValueError('invalid pixel format')
+        self._pix_fmt = val
+
+    @out_pix_fmt.setter
+    def out_pix_fmt(self, val: Union[str, None]):
+
+        if not isinstance(val, str) and val is not None:
+            raise TypeError('argument should be str or None')
+        self._out_pix_fmt = val
+
+    @workers.setter
+    def workers(self, val: int):
+
+        if not isinstance(val, int):
+            raise TypeError('argument should be an integer')
+        if val <= 0:
+            raise ValueError('argument should not be negative')
+        self._workers = val
+
+    @max_inflight.setter
+    def max_inflight(self, val: Union[int, None]):
+
+        if not isinstance(val, int) and val is not None:
+            raise TypeError('argument should be an integer or None')
+        if val is not None and val <= 0:
+            raise ValueError('argument should not be negative')
+        self._max_inflight = val
+
+    @dedup.setter
+    def dedup(self, val: bool):
+
+        if not isinstance(val, bool):
+            raise TypeError('argument should be bool')
+        self._dedup = val
+
+    @queue_size.setter
+    def queue_size(self, val: int):
+
+        if not isinstance(val, int):
+            raise TypeError('argument should be an integer')
+        if val < 0:
+            raise ValueError('argument should not be negative')
+        self._queue_size = val
+
+    @profiler.setter
+    def profiler(self, val: RenderProfiler):
+
+        if not isinstance(val, RenderProfiler):
+            raise TypeError('argument should be a RenderProfiler object')
+        self._profiler = val
+
+    @threads.setter
+    def threads(self, val: Union[int, None]):
+
+        if not isinstance(val, int) and val is not None:
+            raise TypeError('argument should be an integer or None')
+        if val is not None and val < 0:
+            raise ValueError('argument should not be negative')
+        self._threads = val
+
+    @preset.setter
+    def preset(self, val: Union[str, None]):
+
+        if not isinstance(val, str) and val is not None:
+            raise TypeError('argument should be str or None')
+        self._preset = val